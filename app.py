@@ -1,157 +1,187 @@
-from collections import OrderedDict
-from dash.dependencies import Input, Output
-from dash_table.Format import Format, Scheme, Sign, Symbol
-from plotly.graph_objs import *
-from scipy import stats
-from sklearn.model_selection import train_test_split
-
-import base64
-import dash
-import dash_core_components as dcc
-import dash_html_components as html
-import dash_table
-import dash_table.FormatTemplate as FormatTemplate
-import numpy as np
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import startup
+
+with startup.phase('imports'):
+    from collections import OrderedDict
+    from dash.dependencies import ClientsideFunction, Input, Output
+
+    import copy
+    import dash
+    import dash_core_components as dcc
+    import dash_html_components as html
+    import dash_table
+    import gc
+
+    from bivariate import PAIRS, Bivariate
+    from discretize import BIN_SPECS, Discretizer
+    from features import FEATURES
+    from histograms import Histograms
+    from kde import BANDWIDTHS, KDE
+    from qq import DISTRIBUTIONS, QQPlots
+    from rebin import Rebinner, SortedColumns
+    from stats import StatsStore
+    import cache
+    import cohort
+    import compression
+    import config
+    import dataset
+    import images
+    import ingest
+    import metrics
+    import sketch
+    import snapshot
+    import stats
+    import table
 
 
 #--------- Pandas Dataframe
-url = "https://raw.githubusercontent.com/SulmanK/PUBG-EDA-Dashboard-Univariate-App/master/data/PUBG_Player_Statistics.csv"
-orig = pd.read_csv(url, nrows = 1000)
+## Build the columnar cache once (the only step that needs the network),
+## then memory-map it. The data is kept as numpy columns rather than a
+## DataFrame so that, under `gunicorn --preload`, the forked workers share
+## the arrays built here instead of each holding a copy.
+with startup.phase('data load'):
+    if not dataset.exists():
+        ingest.build()
+    data = dataset.load()
 
-## Create a copy of the dataframe
-df = orig.copy()
-cols = np.arange(52, 152, 1)
+## The train/dev/test split is stored with the cache; each is a view.
+## Rows appended to the source only ever extend train, which is shown
+train, dev, test = data.split('train'), data.split('dev'), data.split('test')
 
-## Drop columns after the 52nd index
-df.drop(df.columns[cols], axis = 1, inplace = True)
+## Aggregates behind the figures, built on first use for each snapshot of
+## the train split (see snapshot.py). Those with an update function are
+## carried over to the next snapshot by adding just the appended rows; the
+## others are rebuilt from the new snapshot when next used
 
-## Drop player_name and tracker id
-df.drop(df.columns[[0, 1]], axis = 1, inplace = True)
+## Quantile sketches of every feature, used instead of the full columns
+## when config.APPROXIMATE is set
+def build_sketches(snap):
+    if not config.APPROXIMATE:
+        return None
+    return sketch.load_or_build(snap.data, FEATURES)
 
-## Drop Knockout and Revives
-df.drop(df.columns[[49]], axis = 1, inplace = True)
-df.drop(columns = ['solo_Revives'], inplace = True)
 
-## Drop the string solo from all strings
-df.rename(columns = lambda x: x.lstrip('solo_').rstrip(''), inplace = True)
+def update_sketches(sketches, snap, rows):
+    if sketches is None:
+        return None
+    sketches = copy.deepcopy(sketches)
+    sketches.update(rows)
+    sketches.save(sketch.sketch_path(snap.version))
+    return sketches
 
-## Combine a few columns 
-df['TotalDistance'] = df['WalkDistance'] + df['RideDistance']
-df['AvgTotalDistance'] = df['AvgWalkDistance'] + df['AvgRideDistance']
 
-# Create train and test set using Sci-Kit Learn
-train, test = train_test_split(df, test_size=0.1)
-dev, test = train_test_split(test, test_size = 0.5)
-df = train
+## Histograms of every feature, shown in place of the pre-rendered plots
+def build_histograms(snap):
+    return Histograms(snap.data, sketches = snap.get('sketches'))
 
-#--------- Dashboard
-## Importing Logo and encoding it
-image_filename = 'assets/PUBG_logo.png' 
-encoded_image = base64.b64encode(
-    open(image_filename, 'rb').read())
 
+def update_histograms(histograms, snap, rows):
+    ## update() replaces the count arrays, so a shallow copy will do
+    histograms = copy.copy(histograms)
+    histograms.update(snap.data, rows, sketches = snap.get('sketches'))
+    return histograms
 
-## Importing Plots and encoding it
-### Histogram
-image_filename = 'assets/Histogram_Plots.png' 
-encoded_image1 = base64.b64encode(
-    open(image_filename, 'rb').read())
 
-### Q-Q Plot
-image_filename = 'assets/Probability_Plot_1.png' 
-encoded_image2 = base64.b64encode(
-    open(image_filename, 'rb').read())
+## Interval counts behind the "most players are in ..." statements
+def build_discretizer(snap):
+    return Discretizer(snap.data)
 
-image_filename = 'assets/Probability_Plot_2.png' 
-encoded_image3 = base64.b64encode(
-    open(image_filename, 'rb').read())
 
-image_filename = 'assets/Probability_Plot_3.png' 
-encoded_image4 = base64.b64encode(
-    open(image_filename, 'rb').read())
+def update_discretizer(discretizer, snap, rows):
+    discretizer = copy.deepcopy(discretizer)
+    discretizer.update(rows)
+    return discretizer
 
-### Discretized Distributions
-image_filename = 'assets/Distribution_Kills.png' 
-encoded_image5 = base64.b64encode(
-    open(image_filename, 'rb').read())
 
-image_filename = 'assets/Distribution_Kill-Death-Ratio.png' 
-encoded_image6 = base64.b64encode(
-    open(image_filename, 'rb').read())
+## Sorted copy of every feature, shared by the Q-Q plots and re-binning
+def build_sorted_columns(snap):
+    return SortedColumns(snap.data)
 
-image_filename = 'assets/Distribution_Headshots.png' 
-encoded_image7 = base64.b64encode(
-    open(image_filename, 'rb').read())
 
-image_filename = 'assets/Distribution_Headshot-Kill-Ratio.png' 
-encoded_image8 = base64.b64encode(
-    open(image_filename, 'rb').read())
+def update_sorted_columns(sorted_columns, snap, rows):
+    return sorted_columns.extend(snap.data, rows)
 
-image_filename = 'assets/Distribution_Wins.png' 
-encoded_image9 = base64.b64encode(
-    open(image_filename, 'rb').read())
 
-image_filename = 'assets/Distribution_Win-Ratio.png' 
-encoded_image10 = base64.b64encode(
-    open(image_filename, 'rb').read())
+## Quantile-capped Q-Q plots
+def build_qq_plots(snap):
+    return QQPlots(snap.data, sketches = snap.get('sketches'),
+                   sorted_columns = snap.get('sorted_columns'))
 
-image_filename = 'assets/Distribution_Top10s.png' 
-encoded_image11 = base64.b64encode(
-    open(image_filename, 'rb').read())
 
-image_filename = 'assets/Distribution_Top10-Ratio.png' 
-encoded_image12 = base64.b64encode(
-    open(image_filename, 'rb').read())
+## Interval counts at the bin width picked on each slider
+def build_rebinner(snap):
+    return Rebinner(snap.data, sorted_columns = snap.get('sorted_columns'),
+                    sketches = snap.get('sketches'))
 
-image_filename = 'assets/Distribution_Total-Distance.png' 
-encoded_image13 = base64.b64encode(
-    open(image_filename, 'rb').read())
 
-image_filename = 'assets/Distribution_Average-Distance.png' 
-encoded_image14 = base64.b64encode(
-    open(image_filename, 'rb').read())
+## FFT kernel density estimates drawn over the histograms
+def build_kde(snap):
+    return KDE(snap.data, sketches = snap.get('sketches'))
 
-image_filename = 'assets/Distribution_Time-Survived.png' 
-encoded_image15 = base64.b64encode(
-    open(image_filename, 'rb').read())
 
-image_filename = 'assets/Distribution_Average-Time-Survived.png' 
-encoded_image16 = base64.b64encode(
-    open(image_filename, 'rb').read())
+## Summary statistics of every column, also served by /api/stats
+def build_stats(snap):
+    return StatsStore(snap.data)
 
-image_filename = 'assets/Distribution_Rounds-Played.png' 
-encoded_image17 = base64.b64encode(
-    open(image_filename, 'rb').read())
 
-image_filename = 'assets/Distribution_Damage-Per-Game.png' 
-encoded_image18 = base64.b64encode(
-    open(image_filename, 'rb').read())
+## Feature pairs binned at the zoom level of their graphs
+def build_bivariate(snap):
+    return Bivariate(snap.data)
 
 
+#--------- Dashboard
 ## CSS stylesheet for formatting
 external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
 
 ## Instantiating the dashboard application
+## Responses are compressed by compression.py rather than Flask-Compress
 app = dash.Dash(__name__,
-                external_stylesheets=external_stylesheets)
+                external_stylesheets=external_stylesheets,
+                compress = False)
 
 
 server = app.server
+with startup.phase('image hashing'):
+    images.init_app(server)
+stats.init_app(server, lambda: snapshots.current.get('stats'))
+compression.init_app(server)
+
+## Callback results, shared by all sessions and keyed by the dataset version
+callback_cache = cache.CallbackCache(lambda: snapshots.current)
+cache.init_app(server, callback_cache)
+
+## Timings, sizes and memory at /metrics; registered after compression.py
+## so that sizes are those of the uncompressed responses
+metrics.init_app(server, callback_cache)
 app.config['suppress_callback_exceptions'] = True
 
-## Setting up the dashboard layout
-app.layout = html.Div(
-    [
+## Sections of the dashboard layout
+def binned_distribution(snap, feature):
+    """Interval histogram of a feature with a slider for the bin width."""
+    widths = snap.get('rebinner').widths(feature)
+    return html.Div(
+        [
+            dcc.Graph(id = 'discrete-{}'.format(feature)),
+            dcc.Slider(
+                id = 'bin-width-{}'.format(feature),
+                min = 0,
+                max = len(widths) - 1,
+                step = None,
+                marks = {i: '{:g}'.format(width)
+                         for i, width in enumerate(widths)},
+                value = widths.index(BIN_SPECS[feature][0])
+            )
+        ], className = "six columns"
+    )
+
+
+def header_section():
+    """Logo, title and dataset description."""
+    return [
 
 ### Inserting Logo into Heading and centering it
         html.Div(
             [
-                html.Img(src = 'data:image/png;base64,{}'
-                         .format(encoded_image.decode())
-                        )
+                html.Img(src = images.image_url('PUBG_logo.png'))
             ],
             
             style = 
@@ -177,103 +207,22 @@ app.layout = html.Div(
                     '''
                 )
             ]
-        ),
+        )
+    ]
+
+
+def table_section():
+    """The player DataTable; its rows are served by update_table."""
+    return [
 
 ### Inserting in Datatable
         dash_table.DataTable( 
             id = 'typing_formatting_1',
-            data = df.to_dict('records'),
+            data = [],
             columns =
             [
-                {
-                    'id': 'Kills',
-                    'name': 'Kills',
-                    'type': 'numeric'
-                }, 
-
-                {
-                    'id': 'KillDeathRatio',
-                    'name': 'Kill-Death Ratio',
-                    'type': 'numeric'
-                }, 
-
-                {
-                    'id': 'HeadshotKills',
-                    'name': 'Headshot Kills',
-                    'type': 'numeric'
-                }, 
-
-                {
-                    'id': 'HeadshotKillRatio',
-                    'name': 'Headshot-Kill Ratio',
-                    'type': 'numeric'
-                }, 
-
-                {
-                    'id': 'Wins',
-                    'name': 'Wins',
-                    'type': 'numeric',
-                },  
-
-                {
-                    'id': 'WinRatio',
-                    'name': 'WinRatio (%)',
-                    'type': 'numeric'
-
-                },
-                {
-                    'id': 'Top10s',
-                    'name': 'Top 10s',
-                    'type': 'numeric'
-
-                },
-                {
-                    'id': 'Top10Ratio',
-                    'name': 'Top 10 Ratio',
-                    'type': 'numeric'
-
-                },
-                {
-                    'id': 'TotalDistance',
-                    'name': 'Total Distance',
-                    'type': 'numeric'
-
-                },
-                {
-                    'id': 'AvgTotalDistance',
-                    'name': 'Average Total Distance (miles)',
-                    'type': 'numeric'
-
-                },
-                
-                {
-                    'id': 'TimeSurvived',
-                    'name': 'Survival Time (s)',
-                    'type': 'numeric'
-
-                },
-                
-                {
-                    'id': 'AvgSurvivalTime',
-                    'name': 'Average Survival Time (s)',
-                    'type': 'numeric'
-
-                },
-                
-
-                {
-                    'id': 'RoundsPlayed',
-                    'name': 'Rounds Played',
-                    'type': 'numeric'
-
-                },
-                                {
-                    'id': 'DamagePg',
-                    'name': 'Damage Per Round',
-                    'type': 'numeric'
-
-                },
-                
+                {'id': feature, 'name': name, 'type': 'numeric'}
+                for feature, name in FEATURES.items()
             ],
 
 
@@ -298,21 +247,55 @@ app.layout = html.Div(
                 'font-size': 21
             },
             editable = True,
-            filter_action = "native",
-            sort_action = "native",
+            filter_action = "custom",
+            filter_query = '',
+            sort_action = "custom",
             sort_mode = "multi",
+            sort_by = [],
             column_selectable = "single",
             row_selectable = "multi",
             row_deletable = True,
             selected_columns = [],
             selected_rows = [],
-            page_action = "native",
+            page_action = "custom",
             page_current = 0,
             page_size = 20,
         
         ),
-        html.Div(id = 'typing_formatting_1-container'),
-        
+        ## The current page, column by column; expanded into the table's
+        ## data in the browser
+        dcc.Store(id = 'typing_formatting_1-page'),
+
+### Statistics of the selected or filtered rows
+        html.Div(
+            [
+                html.H3("Cohort Statistics"),
+                dcc.Markdown(
+                    '''
+                    * Statistics of the rows selected in the table or, with none selected, of every row matching its filters.
+                    
+                    '''
+                ),
+                html.Div(id = 'cohort-summary'),
+                dcc.Dropdown(
+                    id = 'cohort-feature',
+                    options = [
+                        {'label': name, 'value': feature}
+                        for feature, name in FEATURES.items()
+                    ],
+                    value = 'KillDeathRatio',
+                    clearable = False
+                ),
+                dcc.Graph(id = 'cohort-histogram')
+            ], id = 'typing_formatting_1-container'
+        )
+    ]
+
+
+def continuous_section(snap):
+    """Histograms and Q-Q plots of every feature."""
+    return [
+
         html.Div(
             [
                 html.H2("Continuous Representations")
@@ -341,25 +324,28 @@ app.layout = html.Div(
             [
                 dcc.Markdown(
                     ''' 
-                    * Most features are right-skewed; only Average Survival Time per round appears to be normal.
+                    * {}
                     
-                    ''')
+                    '''.format(snap.get('stats').shape_summary()))
             ]
         ),
 
-# Insert Histogram Plots
+# Insert Histogram Plots with their kernel density estimates
         html.Div(
             [
-                html.Img(src = 'data:image/png;base64,{}'
-                         .format(encoded_image1.decode())
-                        )
-            ],
-            style = 
-            {
-                'display': 'flex', 'align-items': 'center',
-                'justify-content': 'center'
-            }
-        ),    
+                html.Label("Kernel density bandwidth"),
+                dcc.RadioItems(
+                    id = 'kde-bandwidth',
+                    options = [
+                        {'label': rule.capitalize(), 'value': rule}
+                        for rule in BANDWIDTHS
+                    ] + [{'label': 'None', 'value': 'none'}],
+                    value = 'scott',
+                    labelStyle = {'display': 'inline-block'}
+                )
+            ]
+        ),
+        dcc.Graph(id = 'histogram-grid'),
 
 # Insert Header for Probability Plots
         html.Div(
@@ -384,24 +370,40 @@ app.layout = html.Div(
             [
                 html.Div(
                     [
-                        html.Img(src = 'data:image/png;base64,{}'
-                         .format(encoded_image2.decode()), className = "four columns")
-                    ],
-                ), 
-                html.Div(
-                    [
-                        html.Img(src = 'data:image/png;base64,{}'
-                                 .format(encoded_image3.decode()), className = "four columns")
-                    ],
-                ), 
+                        dcc.Dropdown(
+                            id = 'qq-feature',
+                            options = [
+                                {'label': name, 'value': feature}
+                                for feature, name in FEATURES.items()
+                            ],
+                            value = 'AvgSurvivalTime',
+                            clearable = False
+                        )
+                    ], className = "six columns"
+                ),
                 html.Div(
                     [
-                        html.Img(src = 'data:image/png;base64,{}'
-                                 .format(encoded_image4.decode()), className = "four columns")
-                    ],
+                        dcc.Dropdown(
+                            id = 'qq-distribution',
+                            options = [
+                                {'label': dist, 'value': dist}
+                                for dist in DISTRIBUTIONS
+                            ],
+                            value = 'norm',
+                            clearable = False
+                        )
+                    ], className = "six columns"
                 ),
             ], className = 'row'
         ),
+        dcc.Graph(id = 'qq-plot')
+    ]
+
+
+def discrete_section(snap):
+    """Modal intervals and histograms, two features per row."""
+    discretizer = snap.get('discretizer')
+    return [
 
 # Insert Header for Discrete Representation
         html.Div(
@@ -433,21 +435,23 @@ app.layout = html.Div(
                 html.Div(
                     [
                         dcc.Markdown(
+                            discretizer.describe('Kills',
                             ''' 
-                            * Most players are in the range of 0 - 9 kills, which is 9.1% of the data.
+                            * Most players are in the range of {interval} kills, which is {share} of the data.
                             
-                            ''', className = "six columns"
+                            '''), className = "six columns"
                         )
                     ],
                 ),
                 html.Div(
                     [
                         dcc.Markdown(
+                            discretizer.describe('KillDeathRatio',
                             ''' 
-                            * Most players are in intervals of 0.60 - 0.79, 0.80 - 0.99, and 1.00 - 1.19 (KDR). 
+                            * Most players are in intervals of {intervals} (KDR). 
                             * For reference, a KDR of 1.0 implies that for every death you incur, you accomplish one kill.
                             
-                            ''', className = "six columns" 
+                            '''), className = "six columns" 
                         )
                     ],
                 ), 
@@ -459,14 +463,12 @@ app.layout = html.Div(
             [
                 html.Div(
                     [
-                        html.Img(src = 'data:image/png;base64,{}'
-                                 .format(encoded_image5.decode()), className = "six columns")
+                        binned_distribution(snap, 'Kills')
                     ],
                 ), 
                 html.Div(
                     [
-                        html.Img(src = 'data:image/png;base64,{}'
-                                 .format(encoded_image6.decode()), className = "six columns")
+                        binned_distribution(snap, 'KillDeathRatio')
                     ],
                 ), 
             ], className = 'row'
@@ -485,21 +487,23 @@ app.layout = html.Div(
                 html.Div(
                     [
                         dcc.Markdown(
+                            discretizer.describe('HeadshotKills',
                             ''' 
-                            * Most players are in the range of 0 - 9 headshots, which is 34.4% of the data.
+                            * Most players are in the range of {interval} headshots, which is {share} of the data.
                             
-                            ''', className = "six columns"
+                            '''), className = "six columns"
                         )
                     ],
                 ), 
                 html.Div(
                     [
                         dcc.Markdown(
+                            discretizer.describe('HeadshotKillRatio',
                             ''' 
-                            * Most players are in the intervals of 0.150 - 0.199 and 0.200 - 0.249 (HKR). 
+                            * Most players are in the intervals of {intervals} (HKR). 
                             * For reference, a HKR of 1.0 implies that for every kill you incur, you accomplish one headshot.
 
-                            ''', className = "six columns" 
+                            '''), className = "six columns" 
                         )
                     ],
                 ), 
@@ -511,14 +515,12 @@ app.layout = html.Div(
             [
                 html.Div(
                     [
-                        html.Img(src = 'data:image/png;base64,{}'
-                                 .format(encoded_image7.decode()), className = "six columns")
+                        binned_distribution(snap, 'HeadshotKills')
                     ],
                 ), 
                 html.Div(
                     [
-                        html.Img(src = 'data:image/png;base64,{}'
-                                 .format(encoded_image8.decode()), className = "six columns")
+                        binned_distribution(snap, 'HeadshotKillRatio')
                     ],
                 ), 
             ], className = 'row'
@@ -537,20 +539,22 @@ app.layout = html.Div(
                 html.Div(
                     [
                         dcc.Markdown(
+                            discretizer.describe('Wins',
                             ''' 
-                            * Most players are in the range of 0 - 9 wins, which is 25.8% of the data.
+                            * Most players are in the range of {interval} wins, which is {share} of the data.
                             
-                            ''', className = "six columns" )
+                            '''), className = "six columns" )
                     ],
                 ), 
                 html.Div(
                     [
                         dcc.Markdown(
+                            discretizer.describe('WinRatio',
                             ''' 
-                            * Most players are in the interval of 1.00 - 1.99 (%), which is 12.2% of the data.
+                            * Most players are in the interval of {interval} (%), which is {share} of the data.
                             * For reference, a 1.0% win ratio is analogous to, for every 100 round, one win is achieved.
                 
-                            ''', className = "six columns" 
+                            '''), className = "six columns" 
                         )
                     ],
                 ), 
@@ -562,14 +566,12 @@ app.layout = html.Div(
             [
                 html.Div(
                     [
-                        html.Img(src = 'data:image/png;base64,{}'
-                                 .format(encoded_image9.decode()), className = "six columns")
+                        binned_distribution(snap, 'Wins')
                     ],
                 ), 
                 html.Div(
                     [
-                        html.Img(src = 'data:image/png;base64,{}'
-                                 .format(encoded_image10.decode()), className = "six columns")
+                        binned_distribution(snap, 'WinRatio')
                     ],
                 ), 
             ], className = 'row'
@@ -588,21 +590,23 @@ app.layout = html.Div(
                 html.Div(
                     [
                         dcc.Markdown(
+                            discretizer.describe('Top10s',
                             ''' 
-                            * Most players have not achieved a top 10 finish, which is 6.9% of the data.
+                            * Most players have achieved {interval} top 10 finishes, which is {share} of the data.
 
-                            ''', className = "six columns" 
+                            '''), className = "six columns" 
                         )
                     ],
                 ), 
                 html.Div(
                     [
                         dcc.Markdown(
+                            discretizer.describe('Top10Ratio',
                             ''' 
-                            * Most players are in intervals of 11.00 - 11.99 (%), which is 4.6% of the data.  
+                            * Most players are in intervals of {interval} (%), which is {share} of the data.  
                             * For reference, a 1% top 10 ratio implies that you earn nine top 10 finishes out of 100 rounds played.
 
-                            ''', className = "six columns" 
+                            '''), className = "six columns" 
                         )
                     ],
                 ), 
@@ -613,14 +617,12 @@ app.layout = html.Div(
             [
                 html.Div(
                     [
-                        html.Img(src = 'data:image/png;base64,{}'
-                                 .format(encoded_image11.decode()), className = "six columns")
+                        binned_distribution(snap, 'Top10s')
                     ],
                 ), 
                 html.Div(
                     [
-                        html.Img(src = 'data:image/png;base64,{}'
-                                 .format(encoded_image12.decode()), className = "six columns")
+                        binned_distribution(snap, 'Top10Ratio')
                     ],
                 ), 
             ], className = 'row'
@@ -639,22 +641,24 @@ app.layout = html.Div(
                 html.Div(
                     [
                         dcc.Markdown(
+                            discretizer.describe('TotalDistance',
                             ''' 
-                            * Most players are in the range of 0 - 19999 miles, which is 12.0% of the data.
-                            * The average man will travel 110,000 miles in his lifetime, which is 6x the reported amount from the majority of players.
+                            * Most players are in the range of {interval} miles, which is {share} of the data.
+                            * The average man will travel 110,000 miles in his lifetime.
                 
-                ''', className = "six columns" 
+                '''), className = "six columns" 
                         )
                     ],
                 ), 
                 html.Div(
                     [
                         dcc.Markdown(
+                            discretizer.describe('AvgTotalDistance',
                             ''' 
-                            * Most data is represented in the center  (1800 - 3000 miles).
+                            * Most data is represented in the center ({intervals} miles).
                             * The average man will travel 1,000 miles (driving) + 3.7 miles (walking). 
                 
-                ''', className = "six columns" 
+                '''), className = "six columns" 
                         )
                     ],
                 ), 
@@ -666,14 +670,12 @@ app.layout = html.Div(
             [
                 html.Div(
                     [
-                        html.Img(src = 'data:image/png;base64,{}'
-                                 .format(encoded_image13.decode()), className = "six columns")
+                        binned_distribution(snap, 'TotalDistance')
                     ],
                 ), 
         html.Div(
             [
-                html.Img(src = 'data:image/png;base64,{}'
-                         .format(encoded_image14.decode()), className = "six columns")
+                binned_distribution(snap, 'AvgTotalDistance')
             ],
         ), 
             ], className = 'row'
@@ -693,21 +695,23 @@ html.Div(
                 html.Div(
                     [
                         dcc.Markdown(
+                            discretizer.describe('TimeSurvived',
                             ''' 
-                            * Most players are in the range of 0 - 9999 seconds, which is 15.6% of the data.
-                            * The average man will live 22,075,000 seconds in his lifetime, which is roughly 22,700x the reported amount from the majority of players.        
+                            * Most players are in the range of {interval} seconds, which is {share} of the data.
+                            * The average man will live 22,075,000 seconds in his lifetime.
                             
-                            ''', className = "six columns" 
+                            '''), className = "six columns" 
                         )
                     ],
                 ), 
                 html.Div(
                     [
                         dcc.Markdown(
+                            discretizer.describe('AvgSurvivalTime',
                             ''' 
-                            * Most data is represented in the center (900 - 999 seconds).
+                            * Most data is represented in the center ({interval} seconds), which is {share} of the data.
                             
-                            ''', className = "six columns" )
+                            '''), className = "six columns" )
                     ],
                 ), 
             ], className = 'row'
@@ -718,14 +722,12 @@ html.Div(
             [
                 html.Div(
                     [
-                        html.Img(src = 'data:image/png;base64,{}'
-                                 .format(encoded_image15.decode()), className = "six columns")
+                        binned_distribution(snap, 'TimeSurvived')
                     ],
                 ), 
         html.Div(
             [
-                html.Img(src = 'data:image/png;base64,{}'
-                         .format(encoded_image16.decode()), className = "six columns")
+                binned_distribution(snap, 'AvgSurvivalTime')
             ],
         ), 
             ], className = 'row'
@@ -745,20 +747,22 @@ html.Div(
                 html.Div(
                     [
                         dcc.Markdown(
+                            discretizer.describe('RoundsPlayed',
                             ''' 
-                            * Most players are in the range of 0 - 9 rounds, which is 17.0% of the data.
+                            * Most players are in the range of {interval} rounds, which is {share} of the data.
                             
-                            ''', className = "six columns" 
+                            '''), className = "six columns" 
                         )
                     ],
                 ), 
                 html.Div(
                     [
                         dcc.Markdown(
+                            discretizer.describe('DamagePg',
                             ''' 
-                            * Most data is represented in the center (130 - 139 DPR), which is 6.0% of the data.
+                            * Most data is represented in the center ({interval} DPR), which is {share} of the data.
                             
-                            ''', className = "six columns" 
+                            '''), className = "six columns" 
                         )
                     ],
                 ), 
@@ -769,22 +773,287 @@ html.Div(
             [
                 html.Div(
                     [
-                        html.Img(src = 'data:image/png;base64,{}'
-                                 .format(encoded_image17.decode()), className = "six columns")
+                        binned_distribution(snap, 'RoundsPlayed')
                     ],
                 ), 
                 html.Div(
                     [
-                        html.Img(src = 'data:image/png;base64,{}'
-                                 .format(encoded_image18.decode()), className = "six columns")
+                        binned_distribution(snap, 'DamagePg')
                     ],
                 ), 
             ], className = 'row'
-        ),          
+        )
     ]
-)
+
+
+def bivariate_section():
+    """Zoomable density views of feature pairs, re-binned on every zoom."""
+    return [
+
+        html.Div(
+            [
+                html.H2("Bivariate Representations")
+            ]
+        ),
+        html.Div(
+            [
+                dcc.Markdown(
+                    '''
+                    * Zoom into a region to re-bin it; once few enough players are in view they are drawn individually.
+                    * Double-click to return to the whole population.
+                    
+                    '''
+                )
+            ]
+        ),
+    ] + [
+        dcc.Graph(id = 'bivariate-{}-{}'.format(x, y)) for x, y in PAIRS
+    ]
+
+
+## The tabs of the dashboard, by value: label and the function of the
+## snapshot giving the tab's contents
+SECTIONS = OrderedDict([
+    ('table', ('Table', lambda snap: table_section())),
+    ('continuous', ('Continuous', continuous_section)),
+    ('discrete', ('Discrete', discrete_section)),
+    ('bivariate', ('Bivariate', lambda snap: bivariate_section())),
+])
+
+
+## Setting up the dashboard layout: the header and the tabs only. A tab's
+## contents are sent by render_section once it is opened, so its figures
+## are not computed or sent before then
+def build_layout(snap):
+    with startup.phase('layout build'):
+        return html.Div(
+            header_section() + [
+                dcc.Tabs(
+                    id = 'sections',
+                    value = next(iter(SECTIONS)),
+                    children = [
+                        dcc.Tab(label = label, value = name)
+                        for name, (label, _) in SECTIONS.items()
+                    ]
+                ),
+                html.Div(id = 'section-content')
+            ]
+        )
+
+
+def section_builder(name):
+    """Build the contents of tab ``name`` for a snapshot."""
+    def build(snap):
+        return html.Div(SECTIONS[name][1](snap))
+    return build
+
+
+## The aggregates of each snapshot, in dependency order, with how to build
+## them and how to update them with appended rows
+ENGINES = OrderedDict([
+    ('sketches', (build_sketches, update_sketches)),
+    ('histograms', (build_histograms, update_histograms)),
+    ('discretizer', (build_discretizer, update_discretizer)),
+    ('sorted_columns', (build_sorted_columns, update_sorted_columns)),
+    ('qq_plots', (build_qq_plots, None)),
+    ('rebinner', (build_rebinner, None)),
+    ('kde', (build_kde, None)),
+    ('stats', (build_stats, None)),
+    ('bivariate', (build_bivariate, None)),
+    ('layout', (build_layout, None)),
+])
+for name in SECTIONS:
+    ENGINES['section-{}'.format(name)] = (section_builder(name), None)
+
+## Every request reads the snapshot current when it started; a newer one is
+## swapped in whole when rows are appended to the source
+snapshots = snapshot.Snapshots(train, ENGINES)
+app.layout = lambda: snapshots.current.get('layout')
 
     
 
+#--------- Callbacks
+## Contents of the opened tab, built once per snapshot; the callbacks of
+## the components in it then run as they enter the page
+@app.callback(
+    Output('section-content', 'children'),
+    [
+        Input('sections', 'value')
+    ]
+)
+def render_section(name):
+    if name not in SECTIONS:
+        name = next(iter(SECTIONS))
+    return snapshots.current.get('section-{}'.format(name))
+
+
+## Filter, sort and page the player table on the server, sending only the
+## displayed columns of the page
+@app.callback(
+    [
+        Output('typing_formatting_1-page', 'data'),
+        Output('typing_formatting_1', 'page_count')
+    ],
+    [
+        Input('typing_formatting_1', 'page_current'),
+        Input('typing_formatting_1', 'page_size'),
+        Input('typing_formatting_1', 'sort_by'),
+        Input('typing_formatting_1', 'filter_query')
+    ]
+)
+@callback_cache.memoize
+def update_table(snap, page_current, page_size, sort_by, filter_query):
+    data = snap.data
+    index, page_count = table.query(data, page_current, page_size,
+                                    sort_by, filter_query)
+    return table.columnar(data, index, FEATURES), page_count
+
+
+## Statistics of the selected rows, or of the filtered ones, computed from
+## their positions; the table's row data never comes back to the server
+def cohort_table(summary):
+    """The cohort summary as a table, one row per feature."""
+    def cell(value):
+        if value is None:
+            return '-'
+        return '{:,}'.format(value) if isinstance(value, int) \
+            else '{:,.2f}'.format(value)
+
+    stats = list(next(iter(summary.values())))
+    return html.Table(
+        [html.Tr([html.Th('Feature')] + [html.Th(stat.capitalize())
+                                         for stat in stats])]
+        + [html.Tr([html.Td(FEATURES[feature])]
+                   + [html.Td(cell(values[stat])) for stat in stats])
+           for feature, values in summary.items()]
+    )
+
+
+@app.callback(
+    [
+        Output('cohort-summary', 'children'),
+        Output('cohort-histogram', 'figure')
+    ],
+    [
+        Input('typing_formatting_1', 'filter_query'),
+        Input('typing_formatting_1', 'selected_row_ids'),
+        Input('cohort-feature', 'value')
+    ]
+)
+@callback_cache.memoize
+def update_cohort(snap, filter_query, selected_row_ids, feature):
+    data = snap.data
+    index = cohort.cohort_index(data, filter_query, selected_row_ids)
+    if selected_row_ids:
+        label = 'selected rows'
+    elif filter_query:
+        label = 'filtered rows'
+    else:
+        label = 'players'
+    return (cohort_table(cohort.summarize(data, index)),
+            cohort.histogram(data, index, feature, label))
+
+
+## Expand the page into table rows in the browser (assets/table_data.js)
+app.clientside_callback(
+    ClientsideFunction(namespace = 'table', function_name = 'expand'),
+    Output('typing_formatting_1', 'data'),
+    [
+        Input('typing_formatting_1-page', 'data')
+    ]
+)
+
+
+## Histogram grid, with the density estimates for the selected bandwidth
+@app.callback(
+    Output('histogram-grid', 'figure'),
+    [
+        Input('kde-bandwidth', 'value')
+    ]
+)
+@callback_cache.memoize
+def update_histogram_grid(snap, rule):
+    if rule == 'none':
+        return snap.get('histograms').grid()
+    return snap.get('histograms').grid(kde = snap.get('kde'), rule = rule)
+
+
+## Q-Q plot of the selected feature against the selected distribution
+@app.callback(
+    Output('qq-plot', 'figure'),
+    [
+        Input('qq-feature', 'value'),
+        Input('qq-distribution', 'value')
+    ]
+)
+@callback_cache.memoize
+def update_qq_plot(snap, feature, dist):
+    return snap.get('qq_plots').figure(feature, dist)
+
+
+def warm():
+    """Build the layout, its tabs and every aggregate now, not on first use.
+
+    Called from the gunicorn master under preload (see gunicorn.conf.py) so
+    the forked workers share all of it. Ends the boot: the startup report,
+    if enabled, is logged here.
+    """
+    snap = snapshots.current
+    snap.get('layout')
+    with startup.phase('aggregates'):
+        for name in SECTIONS:
+            snap.get('section-{}'.format(name))
+        snap.get('qq_plots').sort_all()
+        snap.get('bivariate').pair_all()
+        snap.get('stats').stats
+
+    ## Keep the garbage collector from touching (and so copying) the shared
+    ## pages after fork
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+    startup.report()
+
+
+## Re-bin a discrete distribution at the width picked on its slider
+def register_bin_width_callback(feature):
+    @app.callback(
+        Output('discrete-{}'.format(feature), 'figure'),
+        [
+            Input('bin-width-{}'.format(feature), 'value')
+        ]
+    )
+    @callback_cache.memoize(name = 'bin-width-{}'.format(feature))
+    def update_bin_width(snap, index):
+        rebinner = snap.get('rebinner')
+        widths = rebinner.widths(feature)
+        index = min(max(int(index or 0), 0), len(widths) - 1)
+        return rebinner.figure(feature, widths[index])
+
+
+for feature in BIN_SPECS:
+    register_bin_width_callback(feature)
+
+
+## Re-aggregate a bivariate view for the ranges it was zoomed to
+def register_bivariate_callback(x, y):
+    graph = 'bivariate-{}-{}'.format(x, y)
+
+    @app.callback(
+        Output(graph, 'figure'),
+        [
+            Input(graph, 'relayoutData')
+        ]
+    )
+    @callback_cache.memoize(name = graph)
+    def update_bivariate(snap, relayout):
+        return snap.get('bivariate').figure(x, y, relayout)
+
+
+for x, y in PAIRS:
+    register_bivariate_callback(x, y)
+
+
 if __name__ == '__main__':
+    warm()
+    snapshots.watch()
     app.run_server(debug = True)
\ No newline at end of file
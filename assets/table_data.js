@@ -0,0 +1,20 @@
+/* Expand the column-by-column table page sent by update_table (see
+ * table.columnar) into the list of row objects the DataTable displays. */
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    table: {
+        expand: function (page) {
+            if (!page) {
+                return [];
+            }
+            var rows = [];
+            for (var i = 0; i < page.ids.length; i++) {
+                var row = {id: page.ids[i]};
+                for (var j = 0; j < page.columns.length; j++) {
+                    row[page.columns[j]] = page.values[j][i];
+                }
+                rows.push(row);
+            }
+            return rows;
+        }
+    }
+});
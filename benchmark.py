@@ -0,0 +1,374 @@
+"""Load-test the dashboard under gunicorn and record the results as JSON.
+
+For every dataset size a columnar cache is built (once) under
+``<cache-dir>/bench-<nrows>``, ``gunicorn -c gunicorn.conf.py app:server``
+is started on it, and ``--sessions`` simulated users are replayed against
+it, ``--concurrency`` at a time. A session loads ``/``, ``/_dash-layout``
+and ``/_dash-dependencies``, then opens every tab and fires its callbacks
+as a user would: table pages, sorts and filters with their cohort
+statistics, the density bandwidths, Q-Q plots, bin-width sliders and
+bivariate zooms, with inputs drawn from a seeded generator. Latency percentiles,
+throughput and compressed payload bytes are reported per endpoint, with the
+RSS and PSS of every gunicorn worker at the end of the run::
+
+    python benchmark.py --nrows 1000 100000 0 --concurrency 16 \\
+        --output bench.json
+
+``--nrows 0`` benchmarks the full file. Results are keyed by the current
+git commit so that runs can be compared between commits.
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import argparse
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+import config
+import dataset
+import ingest
+from bivariate import PAIRS
+from discretize import BIN_SPECS
+from features import FEATURES
+from qq import DISTRIBUTIONS
+
+
+PERCENTILES = [50, 95, 99]
+TABLE = 'typing_formatting_1'
+PAGE_SIZE = 20
+STARTUP_TIMEOUT = 600
+
+
+#--------- Sessions
+def callback(output, inputs):
+    """Body of a ``/_dash-update-component`` request.
+
+    ``output`` is a list of (id, property) pairs and ``inputs`` a list of
+    (id, property, value) triples. Both the single-string ``output`` of
+    Dash 1.x and the ``outputs`` list of later versions are sent.
+    """
+    outputs = [{'id': id, 'property': prop} for id, prop in output]
+    if len(output) == 1:
+        name = '{}.{}'.format(*output[0])
+        outputs = outputs[0]
+    else:
+        name = '..{}..'.format('...'.join('{}.{}'.format(id, prop)
+                                          for id, prop in output))
+    return {
+        'output': name,
+        'outputs': outputs,
+        'inputs': [{'id': id, 'property': prop, 'value': value}
+                   for id, prop, value in inputs],
+        'changedPropIds': ['{}.{}'.format(id, prop)
+                           for id, prop, value in inputs[:1]],
+        'state': []
+    }
+
+
+def session(rng, rows, ranges):
+    """Requests (label, path, JSON body or None) of one simulated user.
+
+    ``rows`` is the number of rows shown and ``ranges`` maps the bivariate
+    features to the range zooms are drawn from.
+    """
+    requests = [('/', '/', None),
+                ('/_dash-layout', '/_dash-layout', None),
+                ('/_dash-dependencies', '/_dash-dependencies', None)]
+
+    def table(page, sort_by, filter_query):
+        return callback([(TABLE + '-page', 'data'), (TABLE, 'page_count')],
+                        [(TABLE, 'page_current', page),
+                         (TABLE, 'page_size', PAGE_SIZE),
+                         (TABLE, 'sort_by', sort_by),
+                         (TABLE, 'filter_query', filter_query)])
+
+    def section(name):
+        return ('section', None, callback([('section-content', 'children')],
+                                          [('sections', 'value', name)]))
+
+    features = list(FEATURES)
+    requests.append(section('table'))
+    requests.append(('table', None, table(0, [], '')))
+    for _ in range(3):
+        feature = rng.choice(features)
+        sort_by = [{'column_id': feature,
+                    'direction': rng.choice(['asc', 'desc'])}]
+        filter_query = rng.choice(
+            ['', '{{{}}} > {}'.format(feature, rng.randint(0, 5)),
+             '{{{}}} >= {} && {{{}}} < {}'.format(
+                 feature, rng.randint(0, 5), rng.choice(features),
+                 rng.randint(10, 100))])
+        requests.append(('table', None, table(rng.randint(0, 4), sort_by,
+                                              filter_query)))
+
+        ## Cohort statistics of the filtered rows, or of a few selected ones
+        selected = None
+        if rng.random() < 0.5:
+            selected = rng.sample(range(rows), min(rows, rng.randint(1, 20)))
+        requests.append(('cohort', None, callback(
+            [('cohort-summary', 'children'), ('cohort-histogram', 'figure')],
+            [(TABLE, 'filter_query', filter_query),
+             (TABLE, 'selected_row_ids', selected),
+             ('cohort-feature', 'value', rng.choice(features))])))
+
+    requests.append(section('continuous'))
+    for rule in ['scott', rng.choice(['silverman', 'none'])]:
+        requests.append(('histogram-grid', None, callback(
+            [('histogram-grid', 'figure')],
+            [('kde-bandwidth', 'value', rule)])))
+
+    for _ in range(2):
+        requests.append(('qq-plot', None, callback(
+            [('qq-plot', 'figure')],
+            [('qq-feature', 'value', rng.choice(features)),
+             ('qq-distribution', 'value', rng.choice(DISTRIBUTIONS))])))
+
+    requests.append(section('discrete'))
+    for feature in rng.sample(list(BIN_SPECS), 2):
+        requests.append(('bin-width', None, callback(
+            [('discrete-{}'.format(feature), 'figure')],
+            [('bin-width-{}'.format(feature), 'value', rng.randint(0, 4))])))
+
+    ## Zoom into a bivariate view twice, then reset it
+    requests.append(section('bivariate'))
+    x, y = rng.choice(PAIRS)
+    graph = 'bivariate-{}-{}'.format(x, y)
+    for scale in [0.5, 0.05]:
+        relayout = {}
+        for axis, feature in [('xaxis', x), ('yaxis', y)]:
+            lo, hi = ranges[feature]
+            start = rng.uniform(lo, hi - (hi - lo) * scale)
+            relayout[axis + '.range[0]'] = start
+            relayout[axis + '.range[1]'] = start + (hi - lo) * scale
+        requests.append(('bivariate', None, callback(
+            [(graph, 'figure')], [(graph, 'relayoutData', relayout)])))
+    requests.append(('bivariate', None, callback(
+        [(graph, 'figure')],
+        [(graph, 'relayoutData', {'xaxis.autorange': True,
+                                  'yaxis.autorange': True})])))
+    return requests
+
+
+def fetch(url, path, body):
+    """Send one request; returns (status, seconds, bytes on the wire)."""
+    headers = {'Accept-Encoding': 'gzip'}
+    if body is None:
+        request = urllib.request.Request(url + path, headers = headers)
+    else:
+        headers['Content-Type'] = 'application/json'
+        request = urllib.request.Request(
+            url + '/_dash-update-component', headers = headers,
+            data = json.dumps(body).encode('utf-8'))
+
+    start = time.time()
+    try:
+        with urllib.request.urlopen(request) as response:
+            status, size = response.status, len(response.read())
+    except urllib.error.HTTPError as error:
+        status, size = error.code, len(error.read())
+    return status, time.time() - start, size
+
+
+def replay(url, sessions, concurrency, seed, rows, ranges):
+    """Run ``sessions`` sessions over ``concurrency`` threads.
+
+    Returns the (label, status, seconds, bytes) of every request and the
+    wall-clock seconds taken.
+    """
+    results = []
+    lock = threading.Lock()
+
+    def run(index):
+        for label, path, body in session(random.Random(seed + index), rows,
+                                         ranges):
+            status, seconds, size = fetch(url, path, body)
+            with lock:
+                results.append((label, status, seconds, size))
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers = concurrency) as executor:
+        list(executor.map(run, range(sessions)))
+    return results, time.time() - start
+
+
+def summarize(results, seconds):
+    """Latency percentiles (ms), throughput and bytes by endpoint."""
+    by_label = OrderedDict([('all', results)])
+    for result in results:
+        by_label.setdefault(result[0], []).append(result)
+
+    summary = OrderedDict()
+    for label, rows in by_label.items():
+        latency = np.array([row[2] for row in rows]) * 1000
+        sizes = np.array([row[3] for row in rows])
+        entry = OrderedDict([('requests', len(rows)),
+                             ('errors', sum(row[1] >= 400 for row in rows))])
+        for q in PERCENTILES:
+            entry['p{}_ms'.format(q)] = float(np.percentile(latency, q))
+        entry['mean_ms'] = float(latency.mean())
+        entry['throughput_rps'] = len(rows) / seconds
+        entry['mean_bytes'] = float(sizes.mean())
+        entry['total_bytes'] = int(sizes.sum())
+        summary[label] = entry
+    return summary
+
+
+#--------- Server
+def worker_pids(master):
+    """Process ids of the children of ``master``."""
+    pids = []
+    for pid in os.listdir('/proc'):
+        try:
+            with open('/proc/{}/stat'.format(pid)) as f:
+                ## The parent pid is the second field after the command name
+                if int(f.read().rsplit(')', 1)[1].split()[1]) == master:
+                    pids.append(int(pid))
+        except (IOError, ValueError, IndexError):
+            continue
+    return sorted(pids)
+
+
+def memory_mb(pid):
+    """RSS and PSS (memory shared with other workers split between them)."""
+    memory = OrderedDict([('pid', pid), ('rss_mb', None), ('pss_mb', None)])
+    for name, key, field in [('status', 'VmRSS:', 'rss_mb'),
+                             ('smaps_rollup', 'Pss:', 'pss_mb')]:
+        try:
+            with open('/proc/{}/{}'.format(pid, name)) as f:
+                for line in f:
+                    if line.startswith(key):
+                        kb = int(line.split()[1])
+                        memory[field] = round(kb / 1024., 1)
+                        break
+        except IOError:
+            pass
+    return memory
+
+
+def start_server(cache_dir, nrows, port, workers):
+    """Start gunicorn on a cache and wait until it answers."""
+    env = dict(os.environ, PUBG_CACHE_DIR = cache_dir,
+               PUBG_NROWS = str(nrows))
+    command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+               '--workers', str(workers), '--bind',
+               '127.0.0.1:{}'.format(port), 'app:server']
+    process = subprocess.Popen(command, env = env, cwd = config.BASE_DIR)
+
+    url = 'http://127.0.0.1:{}'.format(port)
+    start = time.time()
+    while time.time() - start < STARTUP_TIMEOUT:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn exited with {}'.format(
+                process.returncode))
+        try:
+            urllib.request.urlopen(url + '/_dash-layout').read()
+            return process, url, time.time() - start
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('gunicorn did not start within {}s'.format(
+        STARTUP_TIMEOUT))
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd = config.BASE_DIR,
+            stderr = subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark(nrows, source, cache_dir, port, workers, sessions,
+              concurrency, seed):
+    """Benchmark one dataset size; returns its results."""
+    cache_dir = os.path.join(cache_dir, 'bench-{}'.format(nrows or 'all'))
+    if not dataset.exists(cache_dir):
+        ingest.build(source, nrows, cache_dir)
+    data = dataset.load(cache_dir)
+    rows = data.manifest['rows']
+    train = data.split('train')
+    ranges = {}
+    for feature in set(sum(PAIRS, ())):
+        values = np.asarray(train[feature], dtype = np.float64)
+        ranges[feature] = np.percentile(values[np.isfinite(values)],
+                                        [1, 99]).tolist()
+
+    process, url, startup = start_server(cache_dir, nrows, port, workers)
+    try:
+        ## One untimed session so the first-use work is not in the figures
+        replay(url, 1, 1, seed - 1, len(train), ranges)
+        results, seconds = replay(url, sessions, concurrency, seed,
+                                  len(train), ranges)
+        memory = [memory_mb(pid) for pid in worker_pids(process.pid)]
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait()
+
+    return OrderedDict([
+        ('nrows', nrows), ('rows', rows), ('workers', workers),
+        ('sessions', sessions), ('concurrency', concurrency),
+        ('startup_seconds', startup), ('seconds', seconds),
+        ('endpoints', summarize(results, seconds)),
+        ('worker_memory', memory),
+    ])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--nrows', type = int, nargs = '+',
+                        default = [config.NROWS],
+                        help = 'dataset sizes to benchmark (0 for all)')
+    parser.add_argument('--source', default = config.SOURCE,
+                        help = 'local path or URL of PUBG_Player_Statistics.csv')
+    parser.add_argument('--cache-dir', default = config.CACHE_DIR)
+    parser.add_argument('--workers', type = int, default = 2,
+                        help = 'gunicorn worker processes')
+    parser.add_argument('--sessions', type = int, default = 50,
+                        help = 'simulated user sessions per dataset size')
+    parser.add_argument('--concurrency', type = int, default = 8,
+                        help = 'sessions running at once')
+    parser.add_argument('--port', type = int, default = 8050)
+    parser.add_argument('--seed', type = int, default = 1)
+    parser.add_argument('--output', default = 'benchmark.json',
+                        help = 'JSON file the results are written to')
+    args = parser.parse_args()
+
+    runs = []
+    for nrows in args.nrows:
+        run = benchmark(nrows, args.source, args.cache_dir, args.port,
+                        args.workers, args.sessions, args.concurrency,
+                        args.seed)
+        runs.append(run)
+
+        print('{:,} rows, {} workers, concurrency {}: started in {:.1f}s'
+              .format(run['rows'], args.workers, args.concurrency,
+                      run['startup_seconds']))
+        print('  {:<20} {:>8} {:>9} {:>9} {:>9} {:>9} {:>10}'.format(
+            'endpoint', 'requests', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s',
+            'mean KB'))
+        for label, entry in run['endpoints'].items():
+            print('  {:<20} {:>8} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f} '
+                  '{:>10.1f}'.format(label, entry['requests'],
+                                     entry['p50_ms'], entry['p95_ms'],
+                                     entry['p99_ms'],
+                                     entry['throughput_rps'],
+                                     entry['mean_bytes'] / 1024.))
+        for memory in run['worker_memory']:
+            print('  worker {pid}: RSS {rss_mb} MB, PSS {pss_mb} MB'.format(
+                **memory))
+
+    with open(args.output, 'w') as f:
+        json.dump(OrderedDict([('commit', git_commit()),
+                               ('time', time.strftime('%Y-%m-%dT%H:%M:%S')),
+                               ('runs', runs)]), f, indent = 2)
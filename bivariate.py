@@ -0,0 +1,147 @@
+"""Interactive bivariate views, aggregated on the server at the current zoom.
+
+The browser never receives the whole population: the players inside the
+visible ranges are binned into a ``GRID`` x ``GRID`` density grid drawn as
+a heatmap, and only when at most ``SCATTER_LIMIT`` players are visible are
+their points sent, drawn with WebGL (``Scattergl``). Each pair is kept
+sorted by its x feature, so a zoom reads only the rows in the visible x
+range. The sorted pairs of a cache-backed Dataset are saved next to the
+cache and memory-mapped, so all workers share them.
+"""
+import os
+
+import numpy as np
+import plotly.graph_objects as go
+
+from features import FEATURES
+
+
+## (x, y) feature pairs shown, after the pre-rendered pairwise plots
+PAIRS = [('TimeSurvived', 'KillDeathRatio'),
+         ('TimeSurvived', 'WinRatio'),
+         ('TotalDistance', 'WinRatio')]
+
+GRID = 100
+SCATTER_LIMIT = 5000
+
+
+def zoom_range(relayout, axis):
+    """The range of ``axis`` set by a zoom in ``Graph.relayoutData``.
+
+    ``axis`` is ``'xaxis'`` or ``'yaxis'``; None means the full range.
+    """
+    if not relayout or relayout.get(axis + '.autorange'):
+        return None
+    if axis + '.range[0]' in relayout:
+        return [relayout[axis + '.range[0]'], relayout[axis + '.range[1]']]
+    return relayout.get(axis + '.range')
+
+
+class Bivariate(object):
+    """Density grids, or the points themselves, of feature pairs at any zoom."""
+
+    def __init__(self, data, grid = GRID, scatter_limit = SCATTER_LIMIT):
+        self.data = data
+        self.grid = grid
+        self.scatter_limit = scatter_limit
+        self._pairs = {}
+        cache_dir = getattr(data, 'cache_dir', None)
+        self.directory = (os.path.join(cache_dir,
+                                       'pairs-{}'.format(data.version))
+                          if cache_dir else None)
+
+    def pair(self, x, y):
+        """The finite ``(x, y)`` values of both features, sorted by x."""
+        if (x, y) not in self._pairs:
+            path = (os.path.join(self.directory, '{}-{}.npy'.format(x, y))
+                    if self.directory else None)
+            if path and os.path.exists(path):
+                pair = np.load(path, mmap_mode = 'r')
+            else:
+                pair = self._store(path, self._sorted_pair(x, y))
+            self._pairs[(x, y)] = (pair[0], pair[1])
+        return self._pairs[(x, y)]
+
+    def pair_all(self, pairs = PAIRS):
+        """Sort every pair up front, e.g. before worker processes fork."""
+        for x, y in pairs:
+            self.pair(x, y)
+
+    def _sorted_pair(self, x, y):
+        xs = np.asarray(self.data[x], dtype = np.float64)
+        ys = np.asarray(self.data[y], dtype = np.float64)
+        finite = np.isfinite(xs) & np.isfinite(ys)
+        xs, ys = xs[finite], ys[finite]
+        order = np.argsort(xs, kind = 'mergesort')
+        return np.vstack([xs[order], ys[order]])
+
+    def _store(self, path, pair):
+        if path is None:
+            return pair
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory, exist_ok = True)
+        tmp = '{}.{}.npy'.format(path[:-4], os.getpid())
+        np.save(tmp, pair)
+        os.replace(tmp, path)
+        return np.load(path, mmap_mode = 'r')
+
+    def visible(self, x, y, x_range = None, y_range = None):
+        """The points inside the ranges, and the ranges (full if None)."""
+        xs, ys = self.pair(x, y)
+        if not len(xs):
+            return xs, ys, [0, 1], [0, 1]
+        x_range = list(x_range or [xs[0], xs[-1]])
+        y_range = list(y_range or [ys.min(), ys.max()])
+
+        start = np.searchsorted(xs, x_range[0], side = 'left')
+        stop = np.searchsorted(xs, x_range[1], side = 'right')
+        xs, ys = xs[start: stop], ys[start: stop]
+        inside = (ys >= y_range[0]) & (ys <= y_range[1])
+        return xs[inside], ys[inside], x_range, y_range
+
+    def density(self, xs, ys, x_range, y_range):
+        """Counts of the points in a ``grid`` x ``grid`` grid over the ranges.
+
+        Returns the counts, indexed ``[y bin, x bin]``, and the bin centres.
+        """
+        lo = np.array([x_range[0], y_range[0]], dtype = np.float64)
+        width = (np.array([x_range[1], y_range[1]]) - lo) / self.grid
+        width[width <= 0] = 1
+        ix = np.clip(((xs - lo[0]) // width[0]).astype(np.int64), 0,
+                     self.grid - 1)
+        iy = np.clip(((ys - lo[1]) // width[1]).astype(np.int64), 0,
+                     self.grid - 1)
+        counts = np.bincount(iy * self.grid + ix,
+                             minlength = self.grid ** 2)
+        centres = [lo[i] + width[i] * (np.arange(self.grid) + 0.5)
+                   for i in range(2)]
+        return counts.reshape(self.grid, self.grid), centres[0], centres[1]
+
+    def figure(self, x, y, relayout = None):
+        """Heatmap, or WebGL scatter when few players are visible."""
+        xs, ys, x_range, y_range = self.visible(
+            x, y, zoom_range(relayout, 'xaxis'), zoom_range(relayout, 'yaxis'))
+        if len(xs) <= self.scatter_limit:
+            trace = go.Scattergl(x = xs, y = ys, mode = 'markers',
+                                 marker = {'size': 4, 'opacity': 0.6},
+                                 name = 'Players')
+        else:
+            counts, x_centres, y_centres = self.density(xs, ys, x_range,
+                                                        y_range)
+            ## Empty cells are left transparent
+            trace = go.Heatmap(x0 = x_centres[0],
+                               dx = x_centres[1] - x_centres[0],
+                               y0 = y_centres[0],
+                               dy = y_centres[1] - y_centres[0],
+                               z = np.where(counts, counts, np.nan),
+                               colorscale = 'Viridis',
+                               colorbar = {'title': 'Players'},
+                               hovertemplate = '%{x:.4g}, %{y:.4g}: '
+                                               '%{z} players<extra></extra>')
+        fig = go.Figure(trace)
+        fig.update_layout(
+            title = '{} vs {} ({} players shown)'.format(
+                FEATURES[y], FEATURES[x], len(xs)),
+            xaxis = {'title': FEATURES[x], 'range': x_range},
+            yaxis = {'title': FEATURES[y], 'range': y_range})
+        return fig
@@ -0,0 +1,179 @@
+"""Memoization of Dash callbacks across requests, users and workers.
+
+Results are kept in an in-process LRU and, when ``PUBG_CALLBACK_CACHE_PATH``
+names a SQLite file, in that file as well, so every gunicorn worker (and a
+restarted one) can reuse them. Keys are built from the callback name, its
+JSON arguments and the dataset version, so a new dataset never serves stale
+results. Both tiers evict least recently used entries once over their size
+bound, and hit/miss counters are available from ``stats()`` and
+``/api/cache``.
+"""
+from collections import OrderedDict
+from functools import wraps
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import flask
+from plotly.utils import PlotlyJSONEncoder
+
+import config
+
+
+class LRUCache(object):
+    """Thread-safe in-process cache bounded by its number of entries."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None, False
+            self._items.move_to_end(key)
+            return self._items[key], True
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last = False)
+
+
+class SQLiteCache(object):
+    """Cache shared by processes through a SQLite file, bounded in bytes."""
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    @property
+    def db(self):
+        ## Connections cannot cross threads or forks; open one per thread
+        if getattr(self._local, 'pid', None) != os.getpid():
+            db = sqlite3.connect(self.path, timeout = 10,
+                                 isolation_level = None)
+            db.execute('PRAGMA journal_mode = WAL')
+            db.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY '
+                       'KEY, value TEXT, size INTEGER, accessed REAL)')
+            self._local.db, self._local.pid = db, os.getpid()
+        return self._local.db
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+    def get(self, key):
+        row = self.db.execute('SELECT value FROM cache WHERE key = ?',
+                              (key,)).fetchone()
+        if row is None:
+            return None, False
+        self.db.execute('UPDATE cache SET accessed = ? WHERE key = ?',
+                        (time.time(), key))
+        return json.loads(row[0]), True
+
+    def set(self, key, value):
+        text = json.dumps(value, cls = PlotlyJSONEncoder)
+        db = self.db
+        db.execute('INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)',
+                   (key, text, len(text), time.time()))
+
+        ## Drop the least recently used entries beyond the size bound
+        total = db.execute('SELECT COALESCE(SUM(size), 0) FROM cache'
+                           ).fetchone()[0]
+        if total > self.max_bytes:
+            excess = total - self.max_bytes
+            for old_key, size in db.execute(
+                    'SELECT key, size FROM cache ORDER BY accessed').fetchall():
+                if excess <= 0:
+                    break
+                db.execute('DELETE FROM cache WHERE key = ?', (old_key,))
+                excess -= size
+
+
+class CallbackCache(object):
+    """Two-tier memoizer for Dash callbacks keyed by the dataset version.
+
+    ``current`` is a function returning the current dataset snapshot (see
+    snapshot.py).
+    """
+
+    def __init__(self, current, maxsize = config.CALLBACK_CACHE_SIZE,
+                 path = config.CALLBACK_CACHE_PATH,
+                 max_bytes = config.CALLBACK_CACHE_MAX_BYTES):
+        self.current = current
+        self.local = LRUCache(maxsize)
+        self.shared = SQLiteCache(path, max_bytes) if path else None
+        self.counters = {'hits': 0, 'shared_hits': 0, 'misses': 0}
+
+    def key(self, name, version, args):
+        payload = json.dumps([name, version, args], sort_keys = True,
+                             cls = PlotlyJSONEncoder)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def memoize(self, func = None, name = None):
+        """Decorator caching ``func``'s result per (arguments, version).
+
+        ``func`` is called with the current snapshot before the callback's
+        arguments, and must read the data from it: the snapshot is taken
+        once, so the result is always stored under the version it was
+        computed from. ``name`` must be given for closures that share a
+        function name.
+        """
+        if func is None:
+            return lambda func: self.memoize(func, name)
+        name = name or '{}.{}'.format(func.__module__, func.__name__)
+
+        @wraps(func)
+        def wrapper(*args):
+            snap = self.current()
+            key = self.key(name, snap.version, args)
+            value, hit = self.local.get(key)
+            if hit:
+                self.counters['hits'] += 1
+                return value
+
+            if self.shared is not None:
+                value, hit = self.shared.get(key)
+                if hit:
+                    self.counters['shared_hits'] += 1
+                    self.local.set(key, value)
+                    return value
+
+            self.counters['misses'] += 1
+            value = func(snap, *args)
+            self.local.set(key, value)
+            if self.shared is not None:
+                self.shared.set(key, value)
+            return value
+
+        return wrapper
+
+    def stats(self):
+        lookups = sum(self.counters.values())
+        stats = dict(self.counters, local_entries = len(self.local),
+                     hit_rate = ((self.counters['hits']
+                                  + self.counters['shared_hits']) / lookups
+                                 if lookups else None))
+        if self.shared is not None:
+            stats['shared_entries'] = len(self.shared)
+        return stats
+
+
+def init_app(server, callback_cache):
+    """Serve the cache counters of this worker at ``/api/cache``."""
+
+    def cache_stats():
+        return flask.jsonify(dict(callback_cache.stats(), pid = os.getpid()))
+
+    server.add_url_rule('/api/cache', 'cache_stats', cache_stats)
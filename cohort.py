@@ -0,0 +1,59 @@
+"""Statistics of a cohort of players: the table's selected or filtered rows.
+
+A cohort is a set of row positions into the dataset. The browser only sends
+the table's filter query and selected row ids (the positions, see
+``table.columnar``); the statistics are computed here from the cached column
+arrays rather than from row data posted back by the table. Only the
+cohort's rows are read from each column.
+"""
+from collections import OrderedDict
+
+import numpy as np
+import plotly.graph_objects as go
+
+import table
+from features import FEATURES
+
+
+PERCENTILES = [5, 25, 50, 75, 95]
+BINS = 30
+
+
+def cohort_index(data, filter_query = None, selected_ids = None):
+    """Positions of the selected rows if any, else of the filtered rows."""
+    if selected_ids:
+        index = np.unique(np.asarray(selected_ids, dtype = np.int64))
+        return index[(index >= 0) & (index < len(data))]
+    return table.filter_index(data, filter_query)
+
+
+def summarize(data, index, features = None):
+    """Count, mean and percentiles of each feature over the rows ``index``."""
+    features = list(features or FEATURES)
+    summary = OrderedDict()
+    for feature in features:
+        values = np.asarray(data[feature])[index].astype(np.float64)
+        values = values[np.isfinite(values)]
+        stats = OrderedDict([('count', len(values)),
+                             ('mean', values.mean() if len(values) else None)])
+        percentiles = (np.percentile(values, PERCENTILES) if len(values)
+                       else [None] * len(PERCENTILES))
+        for q, value in zip(PERCENTILES, percentiles):
+            stats['median' if q == 50 else 'p{}'.format(q)] = value
+        summary[feature] = stats
+    return summary
+
+
+def histogram(data, index, feature, label, bins = BINS):
+    """Bar chart of ``feature`` over the rows ``index``."""
+    values = np.asarray(data[feature])[index].astype(np.float64)
+    values = values[np.isfinite(values)]
+    counts, edges = np.histogram(values, bins = bins if len(values) else 1)
+    fig = go.Figure(go.Bar(x = (edges[:-1] + edges[1:]) / 2, y = counts,
+                           width = edges[1] - edges[0],
+                           name = FEATURES[feature]))
+    fig.update_layout(
+        title = '{} of the {} ({} players)'.format(FEATURES[feature], label,
+                                                   len(values)),
+        bargap = 0, xaxis_title = FEATURES[feature], yaxis_title = 'Players')
+    return fig
@@ -0,0 +1,86 @@
+"""Compression and conditional GETs for the Dash JSON endpoints.
+
+Layout, dependency and callback responses are gzip- or Brotli-encoded
+(Brotli when the optional ``brotli`` package is installed and the browser
+accepts it) once they exceed ``COMPRESS_MIN_SIZE``. Layout and dependency
+responses also carry an ETag; a repeat visit that sends it back in
+``If-None-Match`` gets an empty 304.
+"""
+from collections import OrderedDict
+
+import gzip
+
+import flask
+
+import config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSED_PATHS = ('/_dash-layout', '/_dash-dependencies',
+                    '/_dash-update-component')
+CONDITIONAL_PATHS = ('/_dash-layout', '/_dash-dependencies')
+
+## Compressed bodies of the static responses, keyed by (ETag, encoding)
+_cache = OrderedDict()
+CACHE_SIZE = 8
+
+
+def _encoding(request):
+    if brotli is not None and 'br' in request.accept_encodings:
+        return 'br'
+    if 'gzip' in request.accept_encodings:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality = config.BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel = config.COMPRESS_LEVEL)
+
+
+def after_request(response):
+    request = flask.request
+    if (request.method not in ('GET', 'POST')
+            or not request.path.endswith(COMPRESSED_PATHS)
+            or response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    ## The ETag describes the uncompressed JSON, so it is weak: the gzip
+    ## and Brotli encodings are equivalent but not byte-identical
+    etag = None
+    if request.method == 'GET' and request.path.endswith(CONDITIONAL_PATHS):
+        response.add_etag(weak = True)
+        response.headers['Cache-Control'] = 'no-cache'
+        etag = response.get_etag()[0]
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+
+    data = response.get_data()
+    encoding = _encoding(request)
+    if encoding is None or len(data) < config.COMPRESS_MIN_SIZE:
+        return response
+
+    key = (etag, encoding)
+    body = _cache.get(key) if etag else None
+    if body is None:
+        body = compress(data, encoding)
+        if etag:
+            _cache[key] = body
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last = False)
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_app(server):
+    server.after_request(after_request)
@@ -0,0 +1,58 @@
+import os
+
+
+#--------- Paths
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+ASSETS_DIR = os.path.join(BASE_DIR, 'assets')
+
+## Columnar cache written by ingest.py and memory-mapped by the workers
+CACHE_DIR = os.environ.get('PUBG_CACHE_DIR', os.path.join(DATA_DIR, 'cache'))
+
+
+#--------- Raw data source
+SOURCE_URL = "https://raw.githubusercontent.com/SulmanK/PUBG-EDA-Dashboard-Univariate-App/master/data/PUBG_Player_Statistics.csv"
+
+## A local path or URL for the raw player statistics
+SOURCE = os.environ.get('PUBG_SOURCE', SOURCE_URL)
+
+## Number of players to ingest; 0 ingests the whole file
+NROWS = int(os.environ.get('PUBG_NROWS', 1000))
+
+## Seed of the train/dev/test split stored with the cache
+SPLIT_SEED = int(os.environ.get('PUBG_SPLIT_SEED', 0))
+
+## Log a breakdown of worker boot time (see startup.py)
+PROFILE_STARTUP = os.environ.get('PUBG_PROFILE_STARTUP', '') not in ('', '0')
+
+## Serve histograms and Q-Q quantiles from quantile sketches (sketch.py)
+## rather than the full columns
+APPROXIMATE = os.environ.get('PUBG_APPROXIMATE', '') not in ('', '0')
+
+## Seconds between checks of a local source for appended rows, which are
+## then added without a restart (see snapshot.py); 0 turns reloading off
+RELOAD_INTERVAL = float(os.environ.get('PUBG_RELOAD_INTERVAL', 0))
+
+
+#--------- Callback cache (see cache.py)
+## Results kept per worker, and an optional SQLite file shared by workers
+CALLBACK_CACHE_SIZE = int(os.environ.get('PUBG_CALLBACK_CACHE_SIZE', 256))
+CALLBACK_CACHE_PATH = os.environ.get('PUBG_CALLBACK_CACHE_PATH', '')
+CALLBACK_CACHE_MAX_BYTES = int(os.environ.get(
+    'PUBG_CALLBACK_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+
+#--------- Request metrics (see metrics.py)
+## Requests running longer than this many seconds have their stacks sampled
+## every PROFILE_INTERVAL seconds; unset to turn the profiler off
+SLOW_REQUEST_SECONDS = float(os.environ.get('PUBG_SLOW_REQUEST_SECONDS', 0))
+PROFILE_INTERVAL = float(os.environ.get('PUBG_PROFILE_INTERVAL', 0.01))
+
+
+#--------- Response compression (see compression.py)
+## gzip level (1-9) and Brotli quality (0-11) of the Dash JSON responses
+COMPRESS_LEVEL = int(os.environ.get('PUBG_COMPRESS_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('PUBG_BROTLI_QUALITY', 5))
+
+## Responses smaller than this many bytes are sent uncompressed
+COMPRESS_MIN_SIZE = int(os.environ.get('PUBG_COMPRESS_MIN_SIZE', 500))
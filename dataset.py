@@ -0,0 +1,89 @@
+"""Memory-mapped access to the columnar dataset cache built by ingest.py."""
+from collections import OrderedDict
+
+import os
+
+import numpy as np
+
+import config
+from ingest import MANIFEST, read_manifest
+
+
+class Dataset(object):
+    """Read-only, column-oriented view of the processed player statistics.
+
+    Columns are numpy arrays (memory-mapped when loaded from the cache), so
+    only the pages of the columns that are actually touched are read.
+    """
+
+    def __init__(self, columns, manifest, cache_dir = None):
+        self.columns = columns
+        self.manifest = manifest
+        self.cache_dir = cache_dir
+
+    def __len__(self):
+        return self.manifest['rows']
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    @property
+    def names(self):
+        return list(self.columns)
+
+    @property
+    def version(self):
+        """Hash of the cached data, and the split, for caches to key on."""
+        if 'split' in self.manifest:
+            return '{}-{}'.format(self.manifest['version'],
+                                  self.manifest['split'])
+        return self.manifest['version']
+
+    def rows(self, start, stop = None):
+        """Zero-copy view of rows ``start`` to ``stop`` (default: the end).
+
+        Derived statistics are not cached for the view, whose manifest still
+        carries the whole dataset's version.
+        """
+        stop = len(self) if stop is None else stop
+        manifest = dict(self.manifest, rows = max(stop - start, 0))
+        return Dataset(
+            OrderedDict((column, values[start: stop])
+                        for column, values in self.columns.items()),
+            manifest)
+
+    def split(self, name):
+        """Zero-copy view of the ``'train'``, ``'dev'`` or ``'test'`` rows."""
+        start, stop = self.manifest['splits'][name]
+        manifest = dict(self.manifest, rows = stop - start, split = name)
+        return Dataset(
+            OrderedDict((column, values[start: stop])
+                        for column, values in self.columns.items()),
+            manifest, self.cache_dir)
+
+
+def exists(cache_dir = config.CACHE_DIR):
+    return os.path.exists(os.path.join(cache_dir, MANIFEST))
+
+
+def load(cache_dir = config.CACHE_DIR, columns = None):
+    """Memory-map the cached columns; ``columns`` restricts the projection."""
+    manifest = read_manifest(cache_dir)
+
+    names = [c['name'] for c in manifest['columns']]
+    if columns is not None:
+        missing = set(columns) - set(names)
+        if missing:
+            raise KeyError('Columns not in dataset cache: {}'.format(
+                ', '.join(sorted(missing))))
+        names = list(columns)
+
+    ## Columns may already hold rows being appended; keep the manifest's
+    arrays = OrderedDict(
+        (name, np.load(os.path.join(cache_dir, name + '.npy'),
+                       mmap_mode = 'r')[:manifest['rows']])
+        for name in names)
+    return Dataset(arrays, manifest, cache_dir)
@@ -0,0 +1,142 @@
+"""Interval binning of the player features ("most players are in X - Y").
+
+Every feature has a fixed bin width; values are counted for all features
+in one vectorized pass and the counts are kept per feature, so appending
+rows only bins the new rows.
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+from features import join_names
+from histograms import feature_matrix
+
+
+## Feature -> (bin width, decimals shown in the interval labels)
+BIN_SPECS = OrderedDict([
+    ('Kills', (10, 0)),
+    ('KillDeathRatio', (0.2, 2)),
+    ('HeadshotKills', (10, 0)),
+    ('HeadshotKillRatio', (0.05, 3)),
+    ('Wins', (10, 0)),
+    ('WinRatio', (1, 2)),
+    ('Top10s', (1, 0)),
+    ('Top10Ratio', (1, 2)),
+    ('TotalDistance', (20000, 0)),
+    ('AvgTotalDistance', (200, 0)),
+    ('TimeSurvived', (10000, 0)),
+    ('AvgSurvivalTime', (100, 0)),
+    ('RoundsPlayed', (10, 0)),
+    ('DamagePg', (10, 0)),
+])
+
+## Guards x / width against landing just below a whole number, e.g. 0.6 / 0.2
+EPS = 1e-9
+
+
+def rounded_edges(edges, dtype):
+    """Bin edges as a column of ``dtype`` would store them.
+
+    A float32 column (see ingest.compact_dtype) holds 0.45 as 0.449999988;
+    since rounding to float32 keeps order, a stored value is at or above an
+    edge exactly when it is at or above the edge rounded the same way.
+    """
+    if np.dtype(dtype) == np.float32:
+        return np.asarray(edges, dtype = np.float32).astype(np.float64)
+    return edges
+
+
+def bin_ids(values, width, dtype = np.float64):
+    """Bin numbers of ``values`` (from a column of ``dtype``) at ``width``.
+
+    Returned as floats, NaN for NaN.
+    """
+    ids = np.floor(values / width + EPS)
+    if np.dtype(dtype) == np.float32:
+        ## Off by at most one bin; settle it against the rounded edges
+        ids -= values < rounded_edges(ids * width, dtype)
+        ids += values >= rounded_edges((ids + 1) * width, dtype)
+    return ids
+
+
+class Discretizer(object):
+    """Per-feature interval counts that can be updated with new rows."""
+
+    def __init__(self, data = None, specs = BIN_SPECS):
+        self.features = list(specs)
+        self.widths = np.array([specs[f][0] for f in self.features],
+                               dtype = np.float64)
+        self.decimals = [specs[f][1] for f in self.features]
+
+        ## counts[i][j] is the number of players in bin first[i] + j
+        self.first = np.zeros(len(self.features), dtype = np.int64)
+        self.counts = [np.zeros(0, dtype = np.int64) for f in self.features]
+        self.totals = np.zeros(len(self.features), dtype = np.int64)
+        if data is not None:
+            self.update(data)
+
+    def update(self, data):
+        """Add the rows of ``data`` (a DataFrame, Dataset or dict of arrays)."""
+        if not len(data):
+            return
+        matrix = feature_matrix(data, self.features)
+        ids = np.empty(matrix.shape)
+        for i, feature in enumerate(self.features):
+            ids[:, i] = bin_ids(matrix[:, i], self.widths[i],
+                                np.asarray(data[feature]).dtype)
+        finite = np.isfinite(ids)
+        ids = np.where(finite, ids, 0).astype(np.int64)
+
+        ## Widen each feature's bin range to cover the new rows
+        for i, counts in enumerate(self.counts):
+            if not finite[:, i].any():
+                continue
+            lo = ids[finite[:, i], i].min()
+            hi = ids[finite[:, i], i].max()
+            if not len(counts):
+                self.first[i], self.counts[i] = lo, np.zeros(hi - lo + 1,
+                                                             np.int64)
+                continue
+            last = self.first[i] + len(counts) - 1
+            before, after = max(self.first[i] - lo, 0), max(hi - last, 0)
+            if before or after:
+                self.counts[i] = np.pad(counts, (before, after), 'constant')
+                self.first[i] -= before
+
+        ## One bincount over a global bin index for all features
+        sizes = np.array([len(c) for c in self.counts], dtype = np.int64)
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        ids += offsets - self.first
+        new = np.bincount(ids[finite], minlength = sizes.sum())
+        for i, chunk in enumerate(np.split(new, np.cumsum(sizes)[:-1])):
+            self.counts[i] += chunk
+        self.totals += finite.sum(axis = 0)
+
+    def label(self, feature, b):
+        """Interval label of bin number ``b``, e.g. "0.60 - 0.79"."""
+        i = self.features.index(feature)
+        width, decimals = self.widths[i], self.decimals[i]
+        lo = b * width
+        if decimals == 0 and width == 1:
+            return '{:.0f}'.format(lo)
+        return '{0:.{2}f} - {1:.{2}f}'.format(
+            lo, lo + width - 10 ** -decimals, decimals)
+
+    def modes(self, feature, k = 1):
+        """The ``k`` most populous intervals as ``(label, share)`` pairs."""
+        i = self.features.index(feature)
+        counts = self.counts[i]
+        top = np.argsort(-counts, kind = 'mergesort')[:k]
+        total = max(self.totals[i], 1)
+        return [(self.label(feature, self.first[i] + j), counts[j] / total)
+                for j in sorted(top)]
+
+    def describe(self, feature, template, k = 3):
+        """Fill ``template`` with the modal ``{interval}`` and its ``{share}``.
+
+        ``{intervals}`` lists the ``k`` most populous intervals in order.
+        """
+        interval, share = self.modes(feature)[0]
+        return template.format(
+            interval = interval, share = '{:.1%}'.format(share),
+            intervals = join_names(m[0] for m in self.modes(feature, k)))
@@ -0,0 +1,357 @@
+"""Export the dashboard as a static bundle for any static file server.
+
+The layout, with the contents of every tab one after another, is rendered
+to ``index.html`` with every graph filled in as the live dashboard first
+shows it: figures and statistics are computed from the current dataset
+snapshot and written as JSON, and images are copied, all under
+content-hashed names so they can be cached forever. Graphs are drawn
+by plotly.js in the browser once they scroll into view. The interactive
+controls (dropdowns, sliders, zoom re-binning, table queries) need the
+server and are left out; the table shows its first page, and the displayed
+columns of every row are in ``table-<hash>.json``::
+
+    python export.py --output export
+
+``export.json`` records the dataset version the bundle was made from; the
+export is skipped while it is current, and with ``--interval`` the command
+keeps checking for appended rows (see snapshot.py) and exports each new
+version.
+"""
+from collections import OrderedDict
+
+import argparse
+import hashlib
+import html as html_escape
+import json
+import os
+import re
+import time
+
+import numpy as np
+from plotly.offline import get_plotlyjs
+from plotly.utils import PlotlyJSONEncoder
+
+import app
+import cohort
+import images
+import table
+from bivariate import PAIRS
+from discretize import BIN_SPECS
+from features import FEATURES
+
+
+MANIFEST = 'export.json'
+
+## Components that only work against the server
+INTERACTIVE = {'Dropdown', 'RadioItems', 'Slider', 'Store'}
+
+## HTML elements without a closing tag
+VOID = {'br', 'hr', 'img', 'input'}
+
+## Loads each graph's figure JSON once it nears the viewport
+GRAPH_SCRIPT = '''
+(function () {
+    function draw(div) {
+        fetch(div.getAttribute('data-figure')).then(function (response) {
+            return response.json();
+        }).then(function (figure) {
+            Plotly.newPlot(div, figure.data, figure.layout, {responsive: true});
+        });
+    }
+    var graphs = document.querySelectorAll('div[data-figure]');
+    var observer = 'IntersectionObserver' in window
+        ? new IntersectionObserver(function (entries) {
+            entries.forEach(function (entry) {
+                if (entry.isIntersecting) {
+                    observer.unobserve(entry.target);
+                    draw(entry.target);
+                }
+            });
+        }, {rootMargin: '400px'})
+        : null;
+    for (var i = 0; i < graphs.length; i++) {
+        if (observer) { observer.observe(graphs[i]); } else { draw(graphs[i]); }
+    }
+})();
+'''
+
+
+class Bundle(object):
+    """Files of an export, written under content-hashed names."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.files = []
+
+    def write(self, name, content):
+        """Write ``content`` as ``<stem>-<hash><ext>``; return the path."""
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        stem, ext = os.path.splitext(name)
+        digest = hashlib.sha1(content).hexdigest()[:16]
+        path = '{}-{}{}'.format(stem, digest, ext)
+        self._save(path, content)
+        return path
+
+    def write_json(self, name, value):
+        return self.write(name, json.dumps(value, cls = PlotlyJSONEncoder,
+                                           separators = (',', ':')))
+
+    def copy_image(self, url):
+        """Copy an ``images.image_url`` image; return its bundle path."""
+        digest, name = url.rsplit('/', 2)[1:]
+        path = 'images/{}/{}'.format(digest, name)
+        with open(images.image_file(name), 'rb') as f:
+            self._save(path, f.read())
+        return path
+
+    def _save(self, path, content):
+        full = os.path.join(self.directory, path)
+        if not os.path.isdir(os.path.dirname(full)):
+            os.makedirs(os.path.dirname(full))
+        if not os.path.exists(full):
+            with open(full, 'wb') as f:
+                f.write(content)
+        self.files.append(path)
+
+
+#--------- Rendering
+def markdown(text):
+    """HTML of the Markdown used in the layout: bullets, paragraphs, bold."""
+    blocks, items = [], []
+    for line in text.splitlines():
+        line = line.strip()
+        inline = re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>',
+                        html_escape.escape(line[2:] if line[:2] in ('* ', '- ')
+                                           else line))
+        if line[:2] in ('* ', '- '):
+            items.append('<li>{}</li>'.format(inline))
+            continue
+        if items:
+            blocks.append('<ul>{}</ul>'.format(''.join(items)))
+            items = []
+        if line:
+            blocks.append('<p>{}</p>'.format(inline))
+    if items:
+        blocks.append('<ul>{}</ul>'.format(''.join(items)))
+    return ''.join(blocks)
+
+
+def _attributes(props):
+    attributes = []
+    for name, value in props.items():
+        if name == 'children' or value is None:
+            continue
+        if name == 'className':
+            name = 'class'
+        elif name == 'style':
+            value = ';'.join('{}:{}'.format(
+                re.sub('([A-Z])', r'-\1', key).lower(), value)
+                for key, value in value.items())
+        attributes.append('{}="{}"'.format(name,
+                                          html_escape.escape(str(value))))
+    return ' '.join([''] + attributes)
+
+
+def render_table(component, data, index):
+    """The first page of the DataTable as an HTML table."""
+    columns = component.columns
+    page = table.columnar(data, index, [column['id'] for column in columns])
+    header = ''.join('<th>{}</th>'.format(html_escape.escape(column['name']))
+                     for column in columns)
+    rows = ''.join(
+        '<tr>{}</tr>'.format(''.join(
+            '<td>{}</td>'.format('' if values[i] is None else values[i])
+            for values in page['values']))
+        for i in range(len(page['ids'])))
+    return '<table id="{}"><tr>{}</tr>{}</table>'.format(component.id, header,
+                                                          rows)
+
+
+def render(component, bundle, outputs, data, index):
+    """HTML of a Dash component tree.
+
+    ``outputs`` maps component ids to the figure or children the dashboard's
+    callbacks would give them.
+    """
+    if component is None:
+        return ''
+    if isinstance(component, (list, tuple)):
+        return ''.join(render(child, bundle, outputs, data, index)
+                       for child in component)
+    if not hasattr(component, 'to_plotly_json'):
+        return html_escape.escape(str(component))
+
+    kind = component._type
+    props = component.to_plotly_json()['props']
+    component_id = props.get('id')
+    if kind in INTERACTIVE:
+        return ''
+    if kind == 'Markdown':
+        return '<div>{}</div>'.format(markdown(props.get('children') or ''))
+    if kind == 'DataTable':
+        return render_table(component, data, index)
+    if kind == 'Graph':
+        figure = outputs.get(component_id)
+        if figure is None:
+            return ''
+        path = bundle.write_json('figures/{}.json'.format(component_id),
+                                 figure)
+        return '<div id="{}" class="graph" data-figure="{}"></div>'.format(
+            component_id, path)
+
+    if component_id in outputs:
+        props = dict(props, children = outputs[component_id])
+    if kind == 'Img' and props.get('src', '').startswith('/images/'):
+        props = dict(props, src = bundle.copy_image(props['src']))
+
+    tag = kind.lower()
+    if tag in VOID:
+        return '<{}{}>'.format(tag, _attributes(props))
+    return '<{0}{1}>{2}</{0}>'.format(
+        tag, _attributes(props),
+        render(props.get('children'), bundle, outputs, data, index))
+
+
+def initial_outputs(snap):
+    """What the callbacks fill each output with on the dashboard's first view.
+
+    Uses the default values of the controls in the layout.
+    """
+    data = snap.data
+    rebinner = snap.get('rebinner')
+    everyone = cohort.cohort_index(data)
+    outputs = {
+        'histogram-grid': snap.get('histograms').grid(kde = snap.get('kde'),
+                                                      rule = 'scott'),
+        'qq-plot': snap.get('qq_plots').figure('AvgSurvivalTime', 'norm'),
+        'cohort-summary': app.cohort_table(cohort.summarize(data, everyone)),
+        'cohort-histogram': cohort.histogram(data, everyone, 'KillDeathRatio',
+                                             'players'),
+    }
+    for feature in BIN_SPECS:
+        outputs['discrete-{}'.format(feature)] = rebinner.figure(
+            feature, BIN_SPECS[feature][0])
+    for x, y in PAIRS:
+        outputs['bivariate-{}-{}'.format(x, y)] = snap.get(
+            'bivariate').figure(x, y)
+    return outputs
+
+
+#--------- Export
+def read_manifest(directory):
+    """The manifest of the bundle in ``directory``, or None if there is none.
+
+    Raises ValueError for a non-empty directory that holds no bundle: the
+    export only ever replaces its own files.
+    """
+    path = os.path.join(directory, MANIFEST)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    if os.path.isdir(directory) and os.listdir(directory):
+        raise ValueError('{} is not empty and holds no {}; export into a new '
+                         'or empty directory'.format(directory, MANIFEST))
+    return None
+
+
+def export(directory, snap = None, force = False):
+    """Write the bundle for ``snap`` (default: the current snapshot).
+
+    Returns the export manifest, or None when the bundle is already of this
+    dataset version.
+    """
+    snap = snap or app.snapshots.current
+    previous = read_manifest(directory)
+    if not force and previous is not None \
+            and previous.get('version') == snap.version:
+        return None
+    start = time.time()
+    bundle = Bundle(directory)
+
+    data = snap.data
+    first_page, _ = table.query(data, 0, 20, [], '')
+    ## Every tab, one after another, in place of the tabs
+    sections = app.header_section() + [
+        snap.get('section-{}'.format(name)) for name in app.SECTIONS]
+    body = render(sections, bundle, initial_outputs(snap), data, first_page)
+
+    everyone = np.arange(len(data))
+    stats_path = bundle.write_json('stats.json', snap.get('stats').stats)
+    table_path = bundle.write_json('table.json', table.columnar(
+        data, everyone, FEATURES))
+    plotly_path = bundle.write('plotly.min.js', get_plotlyjs())
+
+    stylesheets = ''.join(
+        '<link rel="stylesheet" href="{}">'.format(url)
+        for url in app.external_stylesheets)
+    page = ('<!DOCTYPE html><html><head><meta charset="utf-8">'
+            '<title>{title}</title>{stylesheets}</head><body>{body}'
+            '<p><a href="{stats}">Statistics (JSON)</a> &middot; '
+            '<a href="{table}">Table data (JSON)</a></p>'
+            '<script src="{plotly}"></script><script>{script}</script>'
+            '</body></html>').format(
+                title = html_escape.escape(app.app.title or 'Dash'),
+                stylesheets = stylesheets, body = body, stats = stats_path,
+                table = table_path, plotly = plotly_path,
+                script = GRAPH_SCRIPT)
+
+    ## The page goes in last and atomically, then files it no longer
+    ## refers to are removed
+    index = os.path.join(directory, 'index.html')
+    with open(index + '.tmp', 'w') as f:
+        f.write(page)
+    os.replace(index + '.tmp', index)
+
+    manifest = OrderedDict([
+        ('version', snap.version), ('rows', len(data)),
+        ('seconds', time.time() - start),
+        ('files', sorted(set(bundle.files)))])
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent = 2)
+    if previous is not None:
+        _remove_stale(directory, previous.get('files', []), manifest['files'])
+    return manifest
+
+
+def _remove_stale(directory, previous, current):
+    """Remove the files of the previous export that this one does not use."""
+    for path in set(previous) - set(current):
+        full = os.path.join(directory, *path.split('/'))
+        if os.path.isfile(full):
+            os.remove(full)
+        ## Then its directories, if that left them empty
+        parent = os.path.dirname(full)
+        while os.path.normpath(parent) != os.path.normpath(directory) \
+                and os.path.isdir(parent) and not os.listdir(parent):
+            os.rmdir(parent)
+            parent = os.path.dirname(parent)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--output', default = 'export',
+                        help = 'directory the bundle is written to')
+    parser.add_argument('--force', action = 'store_true',
+                        help = 'export even if the bundle is up to date')
+    parser.add_argument('--interval', type = float, default = 0,
+                        help = 'seconds between checks for a new dataset '
+                               'version (0 exports once)')
+    args = parser.parse_args()
+
+    while True:
+        try:
+            manifest = export(args.output, force = args.force)
+        except ValueError as error:
+            parser.error(str(error))
+        if manifest is not None:
+            print('Exported {} rows ({}) to {} in {:.1f}s: {} files'.format(
+                manifest['rows'], manifest['version'], args.output,
+                manifest['seconds'], len(manifest['files'])))
+        elif not args.interval:
+            print('{} is up to date'.format(args.output))
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+        app.snapshots.reload()
+        args.force = False
@@ -0,0 +1,29 @@
+"""The player features shown in the table and profiled by the dashboard."""
+from collections import OrderedDict
+
+
+## Column id -> display name, in table order
+FEATURES = OrderedDict([
+    ('Kills', 'Kills'),
+    ('KillDeathRatio', 'Kill-Death Ratio'),
+    ('HeadshotKills', 'Headshot Kills'),
+    ('HeadshotKillRatio', 'Headshot-Kill Ratio'),
+    ('Wins', 'Wins'),
+    ('WinRatio', 'WinRatio (%)'),
+    ('Top10s', 'Top 10s'),
+    ('Top10Ratio', 'Top 10 Ratio'),
+    ('TotalDistance', 'Total Distance'),
+    ('AvgTotalDistance', 'Average Total Distance (miles)'),
+    ('TimeSurvived', 'Survival Time (s)'),
+    ('AvgSurvivalTime', 'Average Survival Time (s)'),
+    ('RoundsPlayed', 'Rounds Played'),
+    ('DamagePg', 'Damage Per Round'),
+])
+
+
+def join_names(names):
+    """"a", "a and b" or "a, b, and c"."""
+    names = list(names)
+    if len(names) > 2:
+        return ', '.join(names[:-1]) + ', and ' + names[-1]
+    return ' and '.join(names)
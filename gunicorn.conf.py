@@ -0,0 +1,14 @@
+## Load the app once in the master and fork the workers from it, so they
+## share the memory-mapped dataset and the aggregates built by app.warm()
+preload_app = True
+
+
+def when_ready(server):
+    import app
+    app.warm()
+
+
+def post_fork(server, worker):
+    ## Each worker watches the source for appended rows in its own thread
+    import app
+    app.snapshots.watch()
@@ -0,0 +1,150 @@
+"""Vectorized histograms of the player features.
+
+All features are binned in one NumPy pass: every value is mapped to a
+global bin id (``feature * bins + bin``) and counted with a single
+``np.bincount``. The count arrays are cached until the data is refreshed.
+Given quantile sketches (see sketch.py) the counts are instead estimated
+from the sketches without reading the rows.
+"""
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from features import FEATURES
+
+
+BINS = 50
+
+
+def feature_matrix(data, features):
+    """Stack the given columns into an (N, F) float64 matrix."""
+    return np.column_stack(
+        [np.asarray(data[f], dtype = np.float64) for f in features])
+
+
+def batched_counts(matrix, lo, width, bins):
+    """Count every column of ``matrix`` into ``bins`` equal-width bins.
+
+    ``lo`` and ``width`` hold one entry per column. As in ``np.histogram``
+    the last bin is closed: a value on the top edge is counted in it. Values
+    outside the range are clipped into the first/last bin (callers check the
+    range first) and NaNs are skipped.
+    """
+    n_features = matrix.shape[1]
+    finite = np.isfinite(matrix)
+    idx = np.zeros(matrix.shape, dtype = np.int64)
+    np.floor_divide(matrix - lo, width, out = idx, where = finite,
+                    casting = 'unsafe')
+    idx[idx == bins] = bins - 1
+    np.clip(idx, 0, bins - 1, out = idx)
+    idx += np.arange(n_features) * bins
+    counts = np.bincount(idx[finite], minlength = n_features * bins)
+    return counts.reshape(n_features, bins)
+
+
+class Histograms(object):
+    """Cached bin counts and figures for every feature."""
+
+    def __init__(self, data, features = None, bins = BINS, sketches = None):
+        self.features = list(features or FEATURES)
+        self.bins = bins
+        self.refresh(data, sketches)
+
+    def refresh(self, data, sketches = None):
+        """Recompute all counts from ``data`` (a DataFrame or Dataset).
+
+        With ``sketches`` (a ``sketch.SketchSet``) the counts are estimated
+        from the sketches; ``data`` is then only used for the column dtypes.
+        """
+        if sketches is None:
+            matrix = feature_matrix(data, self.features)
+            lo = np.nanmin(matrix, axis = 0)
+            hi = np.nanmax(matrix, axis = 0)
+        else:
+            lo = np.array([sketches[f].min for f in self.features])
+            hi = np.array([sketches[f].max for f in self.features])
+        width = (hi - lo) / self.bins
+
+        ## Whole-number bins for count features, so no bin is left empty
+        discrete = np.array([np.asarray(data[f]).dtype.kind in 'iu'
+                             for f in self.features])
+        width[discrete] = np.maximum(
+            np.ceil((hi - lo + 1) / self.bins), 1)[discrete]
+        width[width == 0] = 1
+
+        self.edges = lo[:, None] + width[:, None] * np.arange(self.bins + 1)
+        if sketches is None:
+            self.counts = batched_counts(matrix, lo, width, self.bins)
+        else:
+            self.counts = np.array([sketches[f].counts(edges) for f, edges
+                                    in zip(self.features, self.edges)])
+        self._figures = {}
+
+    def update(self, data, rows, sketches = None):
+        """Add ``rows``, the rows just appended to ``data``, to the counts.
+
+        Only the new rows are binned; a feature whose range they widen is
+        re-binned over all of ``data``. With ``sketches`` (updated with the
+        new rows) the counts are re-estimated from them instead. The count
+        and edge arrays are replaced rather than written to, so a copy made
+        before the update keeps the old counts.
+        """
+        if sketches is not None:
+            self.refresh(data, sketches)
+            return
+
+        matrix = feature_matrix(rows, self.features)
+        finite = np.isfinite(matrix)
+        lo, hi = self.edges[:, 0], self.edges[:, -1]
+
+        ## New values in [lo, hi] fit the bins, those on hi in the last
+        ## (closed) one; any other value widens its feature's range
+        inside = ((np.where(finite, matrix, np.inf).min(axis = 0) >= lo)
+                  & (np.where(finite, matrix, -np.inf).max(axis = 0) <= hi))
+        width = self.edges[:, 1] - self.edges[:, 0]
+        self.counts = self.counts + (
+            batched_counts(matrix, lo, width, self.bins) * inside[:, None])
+
+        widened = [f for f, ok in zip(self.features, inside) if not ok]
+        if widened:
+            fresh = Histograms(data, widened, self.bins)
+            self.edges = self.edges.copy()
+            for j, feature in enumerate(widened):
+                i = self.features.index(feature)
+                self.counts[i], self.edges[i] = fresh.counts[j], fresh.edges[j]
+        self._figures = {}
+
+    def __getitem__(self, feature):
+        """Return ``(counts, edges)`` for one feature."""
+        i = self.features.index(feature)
+        return self.counts[i], self.edges[i]
+
+    def trace(self, feature, **kwargs):
+        counts, edges = self[feature]
+        return go.Bar(x = (edges[:-1] + edges[1:]) / 2, y = counts,
+                      width = edges[1] - edges[0], name = FEATURES[feature],
+                      **kwargs)
+
+    def grid(self, cols = 3, kde = None, rule = 'scott'):
+        """All features as one grid of histograms.
+
+        Given a ``kde.KDE``, each histogram is overlaid with its density
+        estimate for the bandwidth ``rule``.
+        """
+        key = (None, rule if kde is not None else None)
+        if key not in self._figures:
+            rows = -(-len(self.features) // cols)
+            fig = make_subplots(
+                rows = rows, cols = cols,
+                subplot_titles = [FEATURES[f] for f in self.features])
+            for i, feature in enumerate(self.features):
+                row, col = i // cols + 1, i % cols + 1
+                fig.add_trace(self.trace(feature), row = row, col = col)
+                if kde is not None:
+                    edges = self[feature][1]
+                    fig.add_trace(kde.trace(feature, rule, edges[1] - edges[0]),
+                                  row = row, col = col)
+            fig.update_layout(height = 250 * rows, showlegend = False,
+                              bargap = 0)
+            self._figures[key] = fig
+        return self._figures[key]
@@ -0,0 +1,61 @@
+"""Serve the dashboard PNGs from assets/ as long-lived, cacheable files.
+
+Each image gets a content-hashed URL (``/images/<digest>/<name>``), so it
+can be cached by browsers and proxies for a year and is re-fetched only
+when the file itself changes.
+"""
+import email.utils
+import hashlib
+import os
+
+import flask
+
+import config
+
+
+ROUTE = '/images/<digest>/<name>'
+MAX_AGE = 365 * 24 * 60 * 60
+
+_images = {}
+
+
+def _register(name, directory = config.ASSETS_DIR):
+    path = os.path.join(directory, name)
+    with open(path, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:16]
+    _images[name] = {'path': path, 'digest': digest,
+                     'mtime': os.path.getmtime(path)}
+    return _images[name]
+
+
+def image_url(name):
+    """Content-hashed URL of a PNG in the assets folder."""
+    image = _images.get(name) or _register(name)
+    return '/images/{}/{}'.format(image['digest'], name)
+
+
+def image_file(name):
+    """Path of a PNG in the assets folder."""
+    return (_images.get(name) or _register(name))['path']
+
+
+def serve_image(digest, name):
+    image = _images.get(name)
+    if image is None or image['digest'] != digest:
+        flask.abort(404)
+
+    response = flask.send_file(image['path'], mimetype = 'image/png')
+    response.set_etag(image['digest'])
+    response.headers['Last-Modified'] = email.utils.formatdate(
+        image['mtime'], usegmt = True)
+    response.headers['Cache-Control'] = 'public, max-age={}, immutable'.format(
+        MAX_AGE)
+    return response.make_conditional(flask.request)
+
+
+def init_app(server, directory = config.ASSETS_DIR):
+    """Hash the PNGs in ``directory`` and register the image route."""
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.png'):
+            _register(name, directory)
+    server.add_url_rule(ROUTE, 'image', serve_image)
@@ -0,0 +1,463 @@
+"""Build the columnar dataset cache used by the dashboard.
+
+Streams the raw player statistics in chunks, reading only the ``solo_``
+columns the dashboard keeps, cleans each chunk and downcasts every column
+to int32/float32 where that loses no precision. The result is written as
+one ``.npy`` file per column plus a ``manifest.json`` into the cache
+directory, so workers can memory-map it at startup without network
+access.
+
+Rows are stored grouped by a reproducible dev/test/train split (train
+last, so appended rows extend it), which lets each split be read as a
+zero-copy slice; the original row positions of each split are saved as
+``split_<name>.npy`` int32 arrays. The manifest records a ``version``
+hash of the data and split for caches of derived statistics to key on::
+
+    python ingest.py --source data/PUBG_Player_Statistics.csv --nrows 0
+
+For a local source the manifest also records how far into the file was
+read, so rows appended to the CSV later can be added to the cache, and to
+its train split, without reading it again::
+
+    python ingest.py --append
+"""
+from collections import OrderedDict
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import config
+from features import FEATURES
+from sketch import SketchSet, load_or_build, sketch_path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+MANIFEST = 'manifest.json'
+CHUNKSIZE = 100000
+
+## Train/dev/test split: 10% is held out, half of which is the test set
+TEST_SIZE = 0.1
+HELD_OUT_TEST_SIZE = 0.5
+
+## Largest decimal places checked when deciding if a float column fits float32
+MAX_DECIMALS = 4
+
+## float32 holds this many significant decimal digits exactly
+FLOAT32_DIGITS = 7
+
+
+def select_columns(header):
+    """The raw columns kept by the pipeline, given the CSV header."""
+    ## The solo_ columns: skip player_name and tracker id and everything
+    ## after the 52nd index
+    cols = list(header[2:52])
+
+    ## Drop Knockout and Revives
+    del cols[49]
+    cols.remove('solo_Revives')
+    return cols
+
+
+def clean(df):
+    """Rename the selected columns and derive the combined ones, in place."""
+    ## Drop the string solo from all strings
+    df.rename(columns = lambda x: x.lstrip('solo_').rstrip(''), inplace = True)
+
+    ## Combine a few columns
+    df['TotalDistance'] = df['WalkDistance'] + df['RideDistance']
+    df['AvgTotalDistance'] = df['AvgWalkDistance'] + df['AvgRideDistance']
+    return df
+
+
+def process(orig):
+    """Apply the dashboard's cleaning pipeline to the raw player statistics."""
+    return clean(orig[select_columns(orig.columns)].copy())
+
+
+def compact_dtype(values):
+    """The smallest of int32/float32 that holds ``values`` exactly.
+
+    Floats are only narrowed when every value has at most ``MAX_DECIMALS``
+    decimals and, in total, fits float32's significant digits, i.e. when
+    the narrowed value still prints as the number in the CSV.
+    """
+    if values.dtype.kind in 'iu':
+        info = np.iinfo(np.int32)
+        if not len(values) or (values.min() >= info.min
+                               and values.max() <= info.max):
+            return np.dtype(np.int32)
+        return values.dtype
+
+    finite = values[np.isfinite(values)]
+    if not len(finite):
+        return np.dtype(np.float32)
+    magnitude = np.abs(finite).max()
+    whole_digits = int(np.floor(np.log10(magnitude))) + 1 if magnitude else 1
+    for decimals in range(MAX_DECIMALS + 1):
+        scale = 10.0 ** decimals
+        if np.array_equal(np.round(finite * scale) / scale, finite):
+            if max(whole_digits, 1) + decimals <= FLOAT32_DIGITS:
+                return np.dtype(np.float32)
+            break
+    return values.dtype
+
+
+def promote(parts):
+    """The dtype for a column from its per-chunk arrays, keeping it narrow."""
+    dtypes = set(part.dtype for part in parts)
+    if dtypes <= {np.dtype(np.int32)}:
+        return np.dtype(np.int32)
+
+    ## Integers mixed into a float32 column must stay exact in float32
+    if dtypes <= {np.dtype(np.int32), np.dtype(np.float32)} and all(
+            np.abs(part).max() <= 2 ** 24 for part in parts
+            if part.dtype.kind == 'i' and len(part)):
+        return np.dtype(np.float32)
+    return np.result_type(*dtypes)
+
+
+def widen(values, dtype):
+    """``values`` as ``dtype``; float32 is widened through its shortest repr.
+
+    A plain cast turns a float32 0.1 into 0.10000000149011612, not the 0.1
+    it was read as.
+    """
+    if values.dtype == np.float32 and dtype == np.float64:
+        return values.astype(str).astype(np.float64)
+    return values.astype(dtype, copy = False)
+
+
+def split_index(rows, seed = config.SPLIT_SEED):
+    """Reproducible dev/test/train row positions as sorted int32 arrays.
+
+    Uses the proportions of the original ``train_test_split`` calls, but
+    with a fixed seed so every worker and restart sees the same split.
+    """
+    permutation = np.random.RandomState(seed).permutation(rows)
+    held_out = int(np.ceil(TEST_SIZE * rows))
+    test = int(np.ceil(HELD_OUT_TEST_SIZE * held_out))
+    parts = [('dev', permutation[:held_out - test]),
+             ('test', permutation[held_out - test: held_out]),
+             ('train', permutation[held_out:])]
+    return OrderedDict((name, np.sort(index).astype(np.int32))
+                       for name, index in parts)
+
+
+def peak_memory_mb():
+    """Peak resident memory of this process in MB, if the OS reports it."""
+    if resource is None:
+        return None
+    ## ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024.0 ** 2 if os.uname()[0] == 'Darwin' else 1024.0)
+
+
+def read_chunks(source = config.SOURCE, nrows = config.NROWS,
+                chunksize = CHUNKSIZE):
+    """Yield cleaned, downcast DataFrame chunks of the raw statistics."""
+    usecols = select_columns(pd.read_csv(source, nrows = 0).columns)
+    reader = pd.read_csv(source, usecols = usecols, nrows = nrows or None,
+                         chunksize = chunksize)
+    for chunk in reader:
+        ## usecols keeps the file's column order; restore the pipeline's
+        chunk = clean(chunk[usecols])
+        yield chunk.astype(
+            {name: compact_dtype(chunk[name].values) for name in chunk})
+
+
+def load(source = config.SOURCE, nrows = config.NROWS, chunksize = CHUNKSIZE):
+    """Read the raw statistics chunk by chunk into compact column arrays.
+
+    Returns the columns and a report with the row count, rows/sec and peak
+    memory of the load.
+    """
+    start = time.time()
+    chunks = OrderedDict()
+    for chunk in read_chunks(source, nrows, chunksize):
+        for name in chunk:
+            chunks.setdefault(name, []).append(chunk[name].values)
+
+    columns = OrderedDict()
+    for name in list(chunks):
+        parts = chunks.pop(name)
+        dtype = promote(parts)
+        columns[name] = np.concatenate([widen(part, dtype) for part in parts])
+
+    rows = len(next(iter(columns.values()))) if columns else 0
+    seconds = time.time() - start
+    report = {'rows': rows, 'seconds': seconds,
+              'rows_per_sec': rows / seconds if seconds else None,
+              'peak_memory_mb': peak_memory_mb()}
+    return columns, report
+
+
+def read_manifest(cache_dir = config.CACHE_DIR):
+    with open(os.path.join(cache_dir, MANIFEST)) as f:
+        return json.load(f, object_pairs_hook = OrderedDict)
+
+
+def write_manifest(manifest, cache_dir = config.CACHE_DIR):
+    ## Written last, and atomically, so a half-written cache is never loaded
+    path = os.path.join(cache_dir, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent = 2)
+    os.replace(path + '.tmp', path)
+
+
+def write_cache(columns, cache_dir = config.CACHE_DIR, splits = None,
+                source = None):
+    """Write every column of ``columns`` as its own ``.npy`` file.
+
+    ``columns`` is a DataFrame or a mapping of column name to array, and
+    ``splits`` maps split names to row positions (default: split_index()).
+    Rows are written grouped by split, in the order of ``splits``. ``source``
+    is the local CSV the columns were read from, if any; rows appended to it
+    afterwards can be added with append().
+    """
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    rows = len(np.asarray(columns[list(columns)[0]])) if len(columns) else 0
+    if splits is None:
+        splits = split_index(rows)
+    order = np.concatenate(list(splits.values()))
+
+    hasher = hashlib.sha1()
+    manifest_columns = []
+    for name in columns:
+        values = np.ascontiguousarray(np.asarray(columns[name])[order])
+        np.save(os.path.join(cache_dir, name + '.npy'), values)
+        manifest_columns.append({'name': name, 'dtype': values.dtype.str})
+        hasher.update(name.encode('utf-8'))
+        hasher.update(values.dtype.str.encode('utf-8'))
+        hasher.update(values)
+
+    bounds = OrderedDict()
+    start = 0
+    for name, index in splits.items():
+        np.save(os.path.join(cache_dir, 'split_{}.npy'.format(name)), index)
+        bounds[name] = [start, start + len(index)]
+        start += len(index)
+        hasher.update(name.encode('utf-8'))
+        hasher.update(np.ascontiguousarray(index))
+
+    ## ``base`` stays the same through appends, telling them from rebuilds
+    version = hasher.hexdigest()[:16]
+    manifest = {'rows': rows, 'columns': manifest_columns, 'splits': bounds,
+                'version': version, 'base': version}
+    if source is not None and os.path.isfile(source):
+        manifest['source'] = {'path': os.path.abspath(source),
+                              'offset': os.path.getsize(source)}
+    write_manifest(manifest, cache_dir)
+    return manifest
+
+
+def build(source = config.SOURCE, nrows = config.NROWS,
+          cache_dir = config.CACHE_DIR, chunksize = CHUNKSIZE):
+    """Stream the raw statistics into the cache; return the load report.
+
+    The features of the train split, which the dashboard shows, are then
+    sketched a chunk at a time under the key the dashboard looks up.
+    """
+    ## dataset.py imports this module
+    import dataset
+
+    columns, report = load(source, nrows, chunksize)
+    write_cache(columns, cache_dir, source = source)
+    del columns
+    load_or_build(dataset.load(cache_dir).split('train'), FEATURES, cache_dir)
+    return report
+
+
+#--------- Appending rows
+def read_appended(path, offset):
+    """The cleaned rows written to the CSV at ``path`` past byte ``offset``.
+
+    Returns the rows as a DataFrame (None if there are none) and the offset
+    just past them; a partly written last line is left for the next call.
+    """
+    size = os.path.getsize(path)
+    if size < offset:
+        raise ValueError('{} is shorter than when it was ingested; rebuild '
+                         'the cache'.format(path))
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(offset)
+        body = f.read(size - offset)
+    body = body[:body.rfind(b'\n') + 1]
+    if not body.strip():
+        return None, offset + len(body)
+
+    usecols = select_columns(pd.read_csv(io.BytesIO(header),
+                                         nrows = 0).columns)
+    frame = pd.read_csv(io.BytesIO(header + body), usecols = usecols)
+    return clean(frame[usecols]), offset + len(body)
+
+
+def append_npy(path, rows, values):
+    """Write ``values`` after the first ``rows`` items of a 1-d ``.npy``.
+
+    The file is extended in place and its header rewritten with the new
+    shape, so arrays already memory-mapped from it stay valid. Returns False,
+    leaving the file as it was, when the dtype differs or the header has no
+    room for the new shape.
+    """
+    fmt = np.lib.format
+    with open(path, 'r+b') as f:
+        major, minor = fmt.read_magic(f)
+        read_header = (fmt.read_array_header_1_0 if major == 1
+                       else fmt.read_array_header_2_0)
+        shape, fortran_order, dtype = read_header(f)
+        start = f.tell()
+        if dtype != values.dtype or len(shape) != 1:
+            return False
+
+        ## Magic string, version and header length come before the header
+        prefix = 10 if major == 1 else 12
+        header = "{{'descr': {!r}, 'fortran_order': False, 'shape': ({},), }}" \
+            .format(fmt.dtype_to_descr(dtype), rows + len(values))
+        if len(header) + 1 > start - prefix:
+            return False
+
+        ## Data first, so the new shape never covers rows not yet written
+        f.seek(start + rows * dtype.itemsize)
+        f.write(np.ascontiguousarray(values).tobytes())
+        f.flush()
+        f.seek(prefix)
+        f.write((header.ljust(start - prefix - 1) + '\n').encode('latin1'))
+    return True
+
+
+class _Lock(object):
+    """Exclusive lock on a file in the cache directory, where supported."""
+
+    def __init__(self, cache_dir):
+        self.path = os.path.join(cache_dir, 'append.lock')
+
+    def __enter__(self):
+        self.file = open(self.path, 'a')
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.file.close()
+
+
+def append(cache_dir = config.CACHE_DIR):
+    """Add the rows appended to the source CSV since it was last read.
+
+    The new rows go to the end of every column, and so to the train split.
+    Safe to call from several processes at once: one of them appends, the
+    others find nothing new. Returns the number of rows added.
+    """
+    manifest = read_manifest(cache_dir)
+    source = manifest.get('source')
+    if source is None or not os.path.isfile(source['path']) \
+            or os.path.getsize(source['path']) <= source['offset']:
+        return 0
+
+    with _Lock(cache_dir):
+        manifest = read_manifest(cache_dir)
+        source = manifest['source']
+        frame, offset = read_appended(source['path'], source['offset'])
+        added = len(frame) if frame is not None else 0
+        rows = manifest['rows']
+
+        hasher = hashlib.sha1(manifest['version'].encode('utf-8'))
+        for column in (manifest['columns'] if added else []):
+            name = column['name']
+            path = os.path.join(cache_dir, name + '.npy')
+            old = np.load(path, mmap_mode = 'r')[:rows]
+            new = frame[name].values
+            new = new.astype(compact_dtype(new))
+            dtype = promote([old, new])
+            new = widen(new, dtype)
+
+            ## A column that needs a wider dtype is rewritten to a new file;
+            ## readers keep the old one until they reload
+            if not append_npy(path, rows, new):
+                tmp = '{}.{}.npy'.format(path[:-4], os.getpid())
+                np.save(tmp, np.concatenate([widen(old, dtype), new]))
+                os.replace(tmp, path)
+            column['dtype'] = dtype.str
+            hasher.update(name.encode('utf-8'))
+            hasher.update(dtype.str.encode('utf-8'))
+            hasher.update(np.ascontiguousarray(new))
+
+        if added:
+            ## Train is stored last, so the new rows extend it
+            bounds = manifest['splits']
+            if list(bounds)[-1] != 'train':
+                raise ValueError('Rows can only be appended to a cache whose '
+                                 'train split is stored last')
+            start, stop = bounds['train']
+            positions = np.arange(rows, rows + added, dtype = np.int32)
+            path = os.path.join(cache_dir, 'split_train.npy')
+            if not append_npy(path, stop - start, positions):
+                tmp = '{}.{}.npy'.format(path[:-4], os.getpid())
+                np.save(tmp, np.concatenate(
+                    [np.load(path)[:stop - start], positions]))
+                os.replace(tmp, path)
+            bounds['train'] = [start, stop + added]
+            hasher.update(positions)
+
+            ## Carry the sketches of the train split over to the new version
+            ## (keyed like Dataset.version); all the new rows are train rows
+            old_sketches = sketch_path(
+                '{}-train'.format(manifest['version']), cache_dir)
+            manifest['rows'] = rows + added
+            manifest['version'] = hasher.hexdigest()[:16]
+            if os.path.exists(old_sketches):
+                sketches = SketchSet.load(old_sketches)
+                sketches.update(frame)
+                sketches.save(sketch_path(
+                    '{}-train'.format(manifest['version']), cache_dir))
+                os.remove(old_sketches)
+
+        source['offset'] = offset
+        write_manifest(manifest, cache_dir)
+    return added
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--source', default = config.SOURCE,
+                        help = 'local path or URL of PUBG_Player_Statistics.csv')
+    parser.add_argument('--nrows', type = int, default = config.NROWS,
+                        help = 'number of players to ingest (0 for all)')
+    parser.add_argument('--chunksize', type = int, default = CHUNKSIZE)
+    parser.add_argument('--cache-dir', default = config.CACHE_DIR)
+    parser.add_argument('--append', action = 'store_true',
+                        help = 'add the rows appended to the source since '
+                               'the cache was built')
+    args = parser.parse_args()
+
+    if args.append:
+        print('Appended {} rows to {}'.format(append(args.cache_dir),
+                                              args.cache_dir))
+    else:
+        report = build(args.source, args.nrows, args.cache_dir,
+                       args.chunksize)
+        print('Wrote {} rows to {} in {:.1f}s ({:,.0f} rows/sec, '
+              'peak memory {} MB)'.format(
+                  report['rows'], args.cache_dir, report['seconds'],
+                  report['rows_per_sec'] or 0,
+                  '{:.0f}'.format(report['peak_memory_mb'])
+                  if report['peak_memory_mb'] is not None else 'n/a'))
@@ -0,0 +1,111 @@
+"""Gaussian kernel density estimates computed by binning and FFT.
+
+Each column is linearly binned onto a regular grid of ``GRID_SIZE`` points
+and the grid counts are convolved with the sampled kernel through an FFT,
+so the cost is O(N + M log M) instead of the O(N * M) of evaluating every
+kernel at every grid point. Densities are cached per (feature, bandwidth).
+Given quantile sketches (see sketch.py) the grid counts are estimated from
+the sketches instead of the rows.
+"""
+import numpy as np
+import plotly.graph_objects as go
+
+from features import FEATURES
+
+
+GRID_SIZE = 1024
+
+## Bandwidth rules offered in the dashboard; a number is used as is
+BANDWIDTHS = ['scott', 'silverman']
+
+## Points per density curve sent to the browser
+PLOT_POINTS = 256
+
+## The grid extends this many bandwidths beyond the data on either side
+CUT = 3
+
+
+def bandwidth(n, std, iqr, rule = 'scott'):
+    """Kernel bandwidth from the sample size, spread and rule of thumb."""
+    if not isinstance(rule, str):
+        return float(rule)
+    spread = min(std, iqr / 1.349) if std and iqr else (std or iqr / 1.349)
+    factor = {'scott': 1.059, 'silverman': 0.9}[rule]
+    return factor * spread * n ** -0.2 if spread else 1.0
+
+
+def linear_binning(values, lo, delta, size):
+    """Split each value's weight between its two neighbouring grid points."""
+    position = (values - lo) / delta
+    index = np.floor(position).astype(np.int64)
+    fraction = position - index
+    counts = np.bincount(index, weights = 1 - fraction, minlength = size + 1)
+    counts += np.bincount(index + 1, weights = fraction, minlength = size + 1)
+    return counts[:size]
+
+
+def convolve_gaussian(counts, delta, bw):
+    """Convolve grid counts with a Gaussian kernel of width ``bw`` via FFT."""
+    size = len(counts)
+    reach = min(size - 1, int(np.ceil(4 * bw / delta)))
+    offsets = np.arange(-reach, reach + 1) * delta
+    kernel = np.exp(-0.5 * (offsets / bw) ** 2) / (bw * np.sqrt(2 * np.pi))
+
+    ## Zero-pad to a power of two past the linear convolution length
+    padded = 1 << int(np.ceil(np.log2(size + 2 * reach)))
+    smoothed = np.fft.irfft(np.fft.rfft(counts, padded)
+                            * np.fft.rfft(kernel, padded), padded)
+    return smoothed[reach: reach + size]
+
+
+class KDE(object):
+    """Cached FFT kernel density estimates of every feature."""
+
+    def __init__(self, data, grid_size = GRID_SIZE, sketches = None):
+        self.data = data
+        self.grid_size = grid_size
+        self.sketches = sketches
+        self._densities = {}
+
+    def _summary(self, feature):
+        """n, std, IQR and range of a feature, plus its finite values."""
+        if self.sketches is not None:
+            sketch = self.sketches[feature]
+            q1, q3 = sketch.quantiles([0.25, 0.75])
+            return sketch.n, None, q3 - q1, sketch.min, sketch.max, None
+        values = np.asarray(self.data[feature], dtype = np.float64)
+        values = values[np.isfinite(values)]
+        q1, q3 = np.percentile(values, [25, 75])
+        return (len(values), values.std(ddof = 1), q3 - q1, values.min(),
+                values.max(), values)
+
+    def density(self, feature, rule = 'scott'):
+        """Return ``(grid, density, n)`` for one feature."""
+        key = (feature, rule)
+        if key not in self._densities:
+            n, std, iqr, lo, hi, values = self._summary(feature)
+            bw = bandwidth(n, std, iqr, rule)
+            grid = np.linspace(lo - CUT * bw, hi + CUT * bw, self.grid_size)
+            delta = grid[1] - grid[0]
+            if values is None:
+                ## Sketch mass in the cell around each grid point
+                edges = np.concatenate([grid - delta / 2,
+                                        [grid[-1] + delta / 2]])
+                counts = self.sketches[feature].counts(edges)
+            else:
+                counts = linear_binning(values, grid[0], delta,
+                                        self.grid_size)
+            density = convolve_gaussian(counts, delta, bw) / n
+            self._densities[key] = (grid, np.maximum(density, 0), n)
+        return self._densities[key]
+
+    def trace(self, feature, rule = 'scott', bin_width = None, **kwargs):
+        """The density as a line; scaled to counts when given ``bin_width``."""
+        grid, density, n = self.density(feature, rule)
+        scale = n * bin_width if bin_width else 1
+        step = max(1, len(grid) // PLOT_POINTS)
+        return go.Scatter(x = grid[::step], y = density[::step] * scale,
+                          mode = 'lines',
+                          name = '{} KDE ({})'.format(
+                              FEATURES.get(feature, feature), rule),
+                          **kwargs)
@@ -0,0 +1,333 @@
+"""Request instrumentation exported in Prometheus text format at /metrics.
+
+Every request is timed and its serialized (pre-compression) body size
+recorded, by route and, for ``/_dash-update-component``, by callback
+output. The boot phases timed by startup.py, the callback cache counters
+(see cache.py) and the process memory are exported with them. Each gunicorn
+worker keeps its own metrics, and every series carries its ``pid`` label.
+
+Set ``PUBG_SLOW_REQUEST_SECONDS`` to turn on a sampling profiler: the stack
+of any request running longer than that is sampled every
+``PUBG_PROFILE_INTERVAL`` seconds, and the samples are served at
+``/metrics/profile`` as collapsed stacks (one ``frame;frame;... count`` line
+per stack, the input of flamegraph.pl).
+"""
+from collections import OrderedDict
+
+import os
+import sys
+import threading
+import time
+
+import flask
+
+import config
+import startup
+
+
+## Bucket upper bounds of the latency (seconds) and size (bytes) histograms
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+SIZE_BUCKETS = [2 ** n for n in range(8, 25, 2)]
+CALLBACK_PATH = '/_dash-update-component'
+
+
+#--------- Prometheus text format
+def _escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _labels(labels):
+    labels = list(labels) + [('pid', os.getpid())]
+    return '{{{}}}'.format(','.join('{}="{}"'.format(name, _escape(value))
+                                    for name, value in labels))
+
+
+def _number(value):
+    return repr(float(value)) if value != float('inf') else '+Inf'
+
+
+class Metric(object):
+    """A named family of series keyed by their label values."""
+
+    kind = 'untyped'
+
+    def __init__(self, name, help, labels = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.series = OrderedDict()
+        self._lock = threading.Lock()
+
+    def header(self):
+        return ['# HELP {} {}'.format(self.name, self.help),
+                '# TYPE {} {}'.format(self.name, self.kind)]
+
+    def labels(self, values):
+        return list(zip(self.label_names, values))
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount = 1):
+        with self._lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def lines(self):
+        lines = self.header()
+        for values, count in list(self.series.items()):
+            lines.append('{}{} {}'.format(self.name,
+                                          _labels(self.labels(values)),
+                                          _number(count)))
+        return lines
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels = (), buckets = LATENCY_BUCKETS):
+        super(Histogram, self).__init__(name, help, labels)
+        self.buckets = list(buckets) + [float('inf')]
+
+    def observe(self, value, *labels):
+        with self._lock:
+            if labels not in self.series:
+                self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts, total, n = self.series[labels]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self.series[labels][1:] = [total + value, n + 1]
+
+    def lines(self):
+        lines = self.header()
+        for values, (counts, total, n) in list(self.series.items()):
+            labels = self.labels(values)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append('{}_bucket{} {}'.format(
+                    self.name, _labels(labels + [('le', _number(bound))]),
+                    cumulative))
+            lines.append('{}_sum{} {}'.format(self.name, _labels(labels),
+                                              _number(total)))
+            lines.append('{}_count{} {}'.format(self.name, _labels(labels), n))
+        return lines
+
+
+def gauge(name, help, samples):
+    """Lines of a gauge; ``samples`` is a list of (labels, value)."""
+    lines = ['# HELP {} {}'.format(name, help),
+             '# TYPE {} gauge'.format(name)]
+    for labels, value in samples:
+        if value is not None:
+            lines.append('{}{} {}'.format(name, _labels(labels),
+                                          _number(value)))
+    return lines
+
+
+REQUEST_SECONDS = Histogram(
+    'pubg_request_seconds', 'Time to answer a request, by route.',
+    ['route', 'method', 'status'])
+RESPONSE_BYTES = Histogram(
+    'pubg_response_bytes', 'Serialized response body size, by route.',
+    ['route', 'method'], buckets = SIZE_BUCKETS)
+CALLBACK_SECONDS = Histogram(
+    'pubg_callback_seconds', 'Time to answer a Dash callback, by output.',
+    ['output', 'status'])
+CALLBACK_BYTES = Histogram(
+    'pubg_callback_bytes', 'Serialized Dash callback response size.',
+    ['output'], buckets = SIZE_BUCKETS)
+SLOW_REQUESTS = Counter(
+    'pubg_slow_requests_total',
+    'Requests that ran past PUBG_SLOW_REQUEST_SECONDS, by route.', ['route'])
+
+
+#--------- Process memory
+def memory_bytes():
+    """Current and peak resident memory of this process, if known."""
+    current = peak = None
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    current = int(line.split()[1]) * 1024
+                elif line.startswith('VmHWM:'):
+                    peak = int(line.split()[1]) * 1024
+    except IOError:
+        pass
+    return current, peak
+
+
+#--------- Slow request profiler
+class SlowRequestProfiler(object):
+    """Sample the stacks of requests running longer than ``threshold``.
+
+    A daemon thread looks at the in-flight requests every ``interval``
+    seconds and, for those past the threshold, counts the current stack of
+    their thread by route.
+    """
+
+    def __init__(self, threshold, interval = config.PROFILE_INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self.active = {}
+        self.stacks = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, route):
+        ## Started lazily so that each forked worker runs its own sampler
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target = self._run, name = 'slow-request-profiler')
+                self._thread.daemon = True
+                self._thread.start()
+        self.active[threading.get_ident()] = (time.time(), route, [False])
+
+    def stop(self):
+        _, route, slow = self.active.pop(threading.get_ident(),
+                                         (None, None, [False]))
+        if slow[0]:
+            SLOW_REQUESTS.inc(route)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            now = time.time()
+            frames = sys._current_frames()
+            for ident, (start, route, slow) in list(self.active.items()):
+                if now - start < self.threshold or ident not in frames:
+                    continue
+                slow[0] = True
+                stack = ';'.join(reversed(self._frames(frames[ident])))
+                key = '{};{}'.format(route, stack)
+                with self._lock:
+                    self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    @staticmethod
+    def _frames(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append('{}:{}'.format(
+                os.path.basename(code.co_filename), code.co_name))
+            frame = frame.f_back
+        return names
+
+    def collapsed(self):
+        with self._lock:
+            return '\n'.join('{} {}'.format(stack, count) for stack, count
+                             in sorted(self.stacks.items()))
+
+
+#--------- Flask hooks
+def _route():
+    rule = flask.request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+def _callback_output():
+    body = flask.request.get_json(silent = True) or {}
+    output = body.get('output', 'unknown')
+    return output if isinstance(output, str) else 'unknown'
+
+
+def init_app(server, callback_cache = None,
+             slow_seconds = config.SLOW_REQUEST_SECONDS):
+    """Time every request of ``server`` and serve the metrics.
+
+    Register after compression.py, so that sizes are measured before
+    compression; statuses are those finally sent.
+    """
+    profiler = SlowRequestProfiler(slow_seconds) if slow_seconds else None
+
+    def before_request():
+        flask.g.metrics_start = time.time()
+        if profiler is not None:
+            profiler.start(_route())
+
+    def measure_size(response):
+        flask.g.metrics_size = (None if response.direct_passthrough
+                                else response.calculate_content_length())
+        return response
+
+    def after_request(response):
+        start = getattr(flask.g, 'metrics_start', None)
+        if start is None:
+            return response
+        seconds = time.time() - start
+        size = getattr(flask.g, 'metrics_size', None)
+        if response.status_code == 304:
+            ## Answered without a body
+            size = 0
+        route, method = _route(), flask.request.method
+
+        REQUEST_SECONDS.observe(seconds, route, method, response.status_code)
+        if size is not None:
+            RESPONSE_BYTES.observe(size, route, method)
+        if flask.request.path == CALLBACK_PATH:
+            output = _callback_output()
+            CALLBACK_SECONDS.observe(seconds, output, response.status_code)
+            if size is not None:
+                CALLBACK_BYTES.observe(size, output)
+        return response
+
+    def teardown_request(exception):
+        if profiler is not None:
+            profiler.stop()
+
+    def metrics():
+        lines = []
+        for metric in [REQUEST_SECONDS, RESPONSE_BYTES, CALLBACK_SECONDS,
+                       CALLBACK_BYTES, SLOW_REQUESTS]:
+            lines.extend(metric.lines())
+
+        lines.extend(gauge(
+            'pubg_startup_phase_seconds', 'Time spent in each boot phase.',
+            [([('phase', name)], seconds)
+             for name, seconds in startup.PHASES.items()]))
+
+        if callback_cache is not None:
+            stats = callback_cache.stats()
+            lines.extend(['# HELP pubg_callback_cache_lookups_total '
+                          'Callback cache lookups, by result.',
+                          '# TYPE pubg_callback_cache_lookups_total counter'])
+            for result in ['hits', 'shared_hits', 'misses']:
+                lines.append('pubg_callback_cache_lookups_total{} {}'.format(
+                    _labels([('result', result)]), stats[result]))
+            lines.extend(gauge(
+                'pubg_callback_cache_entries', 'Entries in the callback cache.',
+                [([('tier', 'local')], stats['local_entries']),
+                 ([('tier', 'shared')], stats.get('shared_entries'))]))
+
+        current, peak = memory_bytes()
+        lines.extend(gauge('process_resident_memory_bytes',
+                           'Resident memory size in bytes.',
+                           [([], current)]))
+        lines.extend(gauge('pubg_peak_resident_memory_bytes',
+                           'Peak resident memory size in bytes.',
+                           [([], peak)]))
+        return flask.Response('\n'.join(lines) + '\n',
+                              mimetype = 'text/plain; version=0.0.4')
+
+    def profile():
+        if profiler is None:
+            return flask.Response('Set PUBG_SLOW_REQUEST_SECONDS to enable '
+                                  'the slow request profiler.\n',
+                                  status = 404, mimetype = 'text/plain')
+        return flask.Response(profiler.collapsed() + '\n',
+                              mimetype = 'text/plain')
+
+    server.before_request(before_request)
+    ## Flask runs after_request hooks in reverse order of registration: the
+    ## size is taken before compression.py's hook, the status and time after
+    ## every hook, so that e.g. its 304s are counted as such
+    server.after_request(measure_size)
+    server.after_request_funcs.setdefault(None, []).insert(0, after_request)
+    server.teardown_request(teardown_request)
+    server.add_url_rule('/metrics', 'metrics', metrics)
+    server.add_url_rule('/metrics/profile', 'metrics_profile', profile)
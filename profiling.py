@@ -0,0 +1,112 @@
+"""Profile every feature in parallel over a process pool.
+
+Each job histograms one column, estimates its density, computes its Q-Q
+fit against the normal distribution and runs normality tests. Jobs are
+handed only the cache directory, split and column name; every worker
+memory-maps the column from the dataset cache, so the data itself is
+shared through the page cache rather than pickled. Results are stored
+under ``"profile"`` in the statistics cache (see stats.py)::
+
+    python profiling.py --workers 8
+"""
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import argparse
+import importlib
+import os
+import time
+
+import numpy as np
+
+import config
+import dataset
+from features import FEATURES
+from histograms import Histograms
+from kde import KDE
+from qq import QQPlots
+from stats import StatsStore
+
+
+def profile_column(cache_dir, split, feature):
+    """Histogram, KDE, Q-Q fit and normality tests of one cached column."""
+    from scipy import stats
+
+    data = dataset.load(cache_dir, columns = [feature])
+    if split is not None:
+        data = data.split(split)
+
+    start = time.time()
+    values = np.asarray(data[feature], dtype = np.float64)
+    values = values[np.isfinite(values)]
+
+    histograms = Histograms({feature: values}, [feature])
+    counts, edges = histograms[feature]
+    grid, density, n = KDE({feature: values}).density(feature)
+    theoretical, sample, fit = QQPlots({feature: values}).points(feature)
+
+    result = OrderedDict([
+        ('histogram', OrderedDict([('counts', counts.tolist()),
+                                   ('edges', edges.tolist())])),
+        ('kde', OrderedDict([('bandwidth', 'scott'),
+                             ('grid', grid.tolist()),
+                             ('density', density.tolist())])),
+        ('qq', OrderedDict([('dist', 'norm'), ('fit', fit),
+                            ('theoretical', theoretical.tolist()),
+                            ('sample', sample.tolist())])),
+    ])
+    if len(values) >= 20:
+        result['normaltest_pvalue'] = stats.normaltest(values)[1]
+        result['jarque_bera_pvalue'] = stats.jarque_bera(values)[1]
+    result['seconds'] = time.time() - start
+    return feature, result
+
+
+def profile(data, features = None, workers = None):
+    """Profile ``features`` of a cache-backed Dataset over a process pool.
+
+    Returns the profiles by feature and the wall-clock seconds taken.
+    """
+    if data.cache_dir is None:
+        raise ValueError('Profiling needs a Dataset loaded from the cache')
+    features = list(features or FEATURES)
+    split = data.manifest.get('split')
+
+    ## Import scipy.stats once here, so forked workers inherit it
+    importlib.import_module('scipy.stats')
+
+    start = time.time()
+    with ProcessPoolExecutor(max_workers = workers) as executor:
+        futures = [executor.submit(profile_column, data.cache_dir, split,
+                                   feature) for feature in features]
+        profiles = OrderedDict(future.result() for future in futures)
+    return profiles, time.time() - start
+
+
+def profile_into(store, features = None, workers = None):
+    """Profile the store's dataset and save the results in the store."""
+    profiles, seconds = profile(store.data, features, workers)
+    for feature, result in profiles.items():
+        store.update(feature, 'profile', result)
+    store.save()
+    return profiles, seconds
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--workers', type = int, default = os.cpu_count(),
+                        help = 'number of worker processes')
+    parser.add_argument('--split', default = 'train',
+                        help = "'train', 'dev', 'test' or 'all'")
+    parser.add_argument('--cache-dir', default = config.CACHE_DIR)
+    args = parser.parse_args()
+
+    data = dataset.load(args.cache_dir)
+    if args.split != 'all':
+        data = data.split(args.split)
+    profiles, seconds = profile_into(StatsStore(data, args.cache_dir),
+                                     workers = args.workers)
+    busy = sum(result['seconds'] for result in profiles.values())
+    print('Profiled {} features of {} rows in {:.2f}s with {} workers '
+          '({:.2f}s of column work)'.format(
+              len(profiles), len(data), seconds, args.workers, busy))
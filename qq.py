@@ -0,0 +1,122 @@
+"""Q-Q plots reduced to a fixed number of quantiles.
+
+Each column is sorted once; a plot then uses about ``N_QUANTILES`` evenly
+spaced order statistics plus the exact ``TAIL`` points at both ends, so the
+payload and the work per request do not grow with the number of players.
+Points and fit statistics are cached per (feature, distribution).
+
+Given quantile sketches (see sketch.py) the sample quantiles are read from
+the sketches instead, so no column needs to be held or sorted; only the
+minimum and maximum of the tails are then exact.
+"""
+import numpy as np
+import plotly.graph_objects as go
+
+from features import FEATURES
+from rebin import SortedColumns
+
+
+N_QUANTILES = 500
+TAIL = 10
+
+## Distributions offered in the dashboard, none of which need shape params
+DISTRIBUTIONS = ['norm', 'expon', 'logistic', 'laplace', 'uniform']
+
+
+def order_statistic_medians(ranks, n):
+    """Filliben's estimate of the uniform order statistic medians.
+
+    Matches ``scipy.stats.probplot`` for the given 0-based ``ranks`` of a
+    sample of size ``n``.
+    """
+    medians = (ranks + 1 - 0.3175) / (n + 0.365)
+    medians[ranks == n - 1] = 0.5 ** (1.0 / n)
+    medians[ranks == 0] = 1 - 0.5 ** (1.0 / n)
+    return medians
+
+
+def plot_ranks(n, n_quantiles = N_QUANTILES, tail = TAIL):
+    """Ranks plotted for a sample of size ``n``: exact tails plus quantiles."""
+    if n <= n_quantiles + 2 * tail:
+        return np.arange(n)
+    middle = np.linspace(0, n - 1, n_quantiles).round().astype(np.int64)
+    return np.unique(np.concatenate(
+        [np.arange(tail), middle, np.arange(n - tail, n)]))
+
+
+class QQPlots(object):
+    """Cached, quantile-capped probability plots for every feature."""
+
+    def __init__(self, data, n_quantiles = N_QUANTILES, tail = TAIL,
+                 sketches = None, sorted_columns = None):
+        self.data = data
+        self.sketches = sketches
+        self.n_quantiles = n_quantiles
+        self.tail = tail
+        self.sorted_columns = sorted_columns or SortedColumns(data)
+        self._points = {}
+
+    def sorted(self, feature):
+        """The finite values of ``feature``, sorted once and cached."""
+        return self.sorted_columns[feature]
+
+    def sort_all(self, features = None):
+        """Sort every feature up front, e.g. before worker processes fork."""
+        if self.sketches is not None:
+            return
+        for feature in features or FEATURES:
+            self.sorted(feature)
+
+    def points(self, feature, dist = 'norm'):
+        """Return ``(theoretical, sample, fit)`` for one feature.
+
+        ``fit`` holds the least-squares ``slope``, ``intercept`` and ``r`` of
+        the plotted points, as reported by ``scipy.stats.probplot``.
+        """
+        key = (feature, dist)
+        if key not in self._points:
+            ## scipy.stats is slow to import and only needed once plotted
+            from scipy import stats
+
+            if self.sketches is None:
+                values = self.sorted(feature)
+                n = len(values)
+            else:
+                n = self.sketches[feature].n
+            ranks = plot_ranks(n, self.n_quantiles, self.tail)
+            probabilities = order_statistic_medians(
+                ranks.astype(np.float64), n)
+            theoretical = getattr(stats, dist).ppf(probabilities)
+            if self.sketches is None:
+                sample = values[ranks]
+            else:
+                sample = self.sketches[feature].quantiles(probabilities)
+            slope, intercept, r = stats.linregress(theoretical, sample)[:3]
+            fit = {'slope': slope, 'intercept': intercept, 'r': r, 'n': n}
+            self._points[key] = (theoretical, sample, fit)
+        return self._points[key]
+
+    def figure(self, feature, dist = 'norm'):
+        """Sample vs theoretical quantiles with the fitted line."""
+        theoretical, sample, fit = self.points(feature, dist)
+        ends = theoretical[[0, -1]]
+        fig = go.Figure(
+            [
+                go.Scatter(x = theoretical, y = sample, mode = 'markers',
+                           name = 'Ordered values'),
+                go.Scatter(x = ends,
+                           y = fit['slope'] * ends + fit['intercept'],
+                           mode = 'lines', name = 'R² = {:.4f}'.format(
+                               fit['r'] ** 2))
+            ]
+        )
+        title = '{} ({} players)'.format(FEATURES.get(feature, feature),
+                                         fit['n'])
+        if self.sketches is not None:
+            title += ' - approximate, rank error ±{:.1%}'.format(
+                self.sketches[feature].rank_error())
+        fig.update_layout(
+            title = title,
+            xaxis_title = 'Theoretical quantiles ({})'.format(dist),
+            yaxis_title = 'Ordered values')
+        return fig
@@ -0,0 +1,161 @@
+"""Re-binning the player features at any bin width without rescanning them.
+
+Each feature is sorted once per dataset version (``SortedColumns``); the
+count of every interval at a new bin width is then the difference of
+``np.searchsorted`` positions of its edges, O(bins * log N). Sorted copies
+of a cache-backed Dataset are saved next to the cache and memory-mapped,
+so all workers share them.
+"""
+import os
+
+import numpy as np
+import plotly.graph_objects as go
+
+from discretize import BIN_SPECS, EPS, bin_ids, rounded_edges
+from features import FEATURES
+
+
+## Multiples of a feature's default width offered on its slider
+WIDTH_FACTORS = [0.1, 0.2, 0.5, 1, 2, 5, 10]
+
+## Widths giving more intervals than this are widened to fit
+MAX_BINS = 2000
+
+
+class SortedColumns(object):
+    """The finite values of each feature, sorted once and cached."""
+
+    def __init__(self, data):
+        self.data = data
+        self._sorted = {}
+        cache_dir = getattr(data, 'cache_dir', None)
+        self.directory = (os.path.join(cache_dir,
+                                       'sorted-{}'.format(data.version))
+                          if cache_dir else None)
+
+    def __getitem__(self, feature):
+        if feature not in self._sorted:
+            path = (os.path.join(self.directory, feature + '.npy')
+                    if self.directory else None)
+            if path and os.path.exists(path):
+                self._sorted[feature] = np.load(path, mmap_mode = 'r')
+                return self._sorted[feature]
+
+            values = np.asarray(self.data[feature], dtype = np.float64)
+            self._store(feature, np.sort(values[np.isfinite(values)]))
+        return self._sorted[feature]
+
+    def _store(self, feature, values):
+        if self.directory:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory, exist_ok = True)
+            path = os.path.join(self.directory, feature + '.npy')
+            tmp = '{}.{}.npy'.format(path[:-4], os.getpid())
+            np.save(tmp, values)
+            os.replace(tmp, path)
+            values = np.load(path, mmap_mode = 'r')
+        self._sorted[feature] = values
+
+    def extend(self, data, rows):
+        """The sorted columns of ``data``, whose last rows ``rows`` are new.
+
+        Features already sorted here are merged with the sorted new values
+        instead of being sorted again; the others are sorted on first use.
+        """
+        extended = SortedColumns(data)
+        for feature, values in list(self._sorted.items()):
+            ## Another worker may have merged it already
+            if extended.directory and os.path.exists(
+                    os.path.join(extended.directory, feature + '.npy')):
+                extended[feature]
+                continue
+            new = np.asarray(rows[feature], dtype = np.float64)
+            new = np.sort(new[np.isfinite(new)])
+            extended._store(feature, np.insert(
+                values, np.searchsorted(values, new), new))
+        return extended
+
+
+def candidate_widths(width, integer = False):
+    """Bin widths around ``width``; whole numbers only for count features."""
+    widths = []
+    for factor in WIDTH_FACTORS:
+        candidate = float('{:.10g}'.format(width * factor))
+        if integer and (candidate < 1 or candidate != int(candidate)):
+            continue
+        widths.append(candidate)
+    return widths
+
+
+def nice_factor(minimum):
+    """The smallest 1, 2 or 5 times a power of ten that is >= ``minimum``."""
+    power = 10.0 ** np.floor(np.log10(minimum))
+    for step in (1, 2, 5, 10):
+        if step * power >= minimum:
+            return step * power
+
+
+class Rebinner(object):
+    """Interval counts of every feature at any bin width."""
+
+    def __init__(self, data, sorted_columns = None, sketches = None):
+        self.data = data
+        self.sorted_columns = sorted_columns or SortedColumns(data)
+        self.sketches = sketches
+        self._figures = {}
+
+    def widths(self, feature):
+        """Widths offered for ``feature``, including its default one."""
+        integer = np.asarray(self.data[feature]).dtype.kind in 'iu'
+        return candidate_widths(BIN_SPECS[feature][0], integer)
+
+    def counts(self, feature, width):
+        """Return ``(counts, edges)`` of ``feature`` at bin ``width``.
+
+        Bins are aligned to multiples of ``width`` as in discretize.py; a
+        width giving more than ``MAX_BINS`` intervals is widened.
+        """
+        if self.sketches is None:
+            values = self.sorted_columns[feature]
+            lo, hi = values[0], values[-1]
+        else:
+            sketch = self.sketches[feature]
+            lo, hi = sketch.min, sketch.max
+
+        dtype = np.asarray(self.data[feature]).dtype
+        first = bin_ids(lo, width, dtype)
+        bins = int(bin_ids(hi, width, dtype) - first) + 1
+        if bins > MAX_BINS:
+            width *= nice_factor(bins / float(MAX_BINS))
+            first = bin_ids(lo, width, dtype)
+            bins = int(bin_ids(hi, width, dtype) - first) + 1
+        edges = (first + np.arange(bins + 1)) * width
+
+        ## Place the edges as discretize.py does: shifted down by its
+        ## tolerance, or where a float32 column stores them
+        if dtype == np.float32:
+            shifted = rounded_edges(edges, dtype)
+        else:
+            shifted = edges - EPS * width
+        if self.sketches is None:
+            counts = np.diff(np.searchsorted(values, shifted, side = 'left'))
+        else:
+            counts = sketch.counts(shifted)
+        return counts, edges
+
+    def figure(self, feature, width):
+        """Bar chart of ``feature`` at bin ``width``."""
+        key = (feature, width)
+        if key not in self._figures:
+            counts, edges = self.counts(feature, width)
+            actual = edges[1] - edges[0]
+            fig = go.Figure(go.Bar(x = (edges[:-1] + edges[1:]) / 2,
+                                   y = counts, width = actual,
+                                   name = FEATURES[feature]))
+            fig.update_layout(
+                title = '{} (bin width {:g})'.format(FEATURES[feature],
+                                                     actual),
+                bargap = 0, xaxis_title = FEATURES[feature],
+                yaxis_title = 'Players')
+            self._figures[key] = fig
+        return self._figures[key]
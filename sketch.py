@@ -0,0 +1,223 @@
+"""Mergeable approximate quantile sketches (KLL) of the player features.
+
+A ``KLLSketch`` keeps a bounded number of samples per level, each level's
+samples standing for ``2 ** level`` values, so its memory depends only on
+``k`` and not on how many values it has seen. Sketches of different chunks
+or processes are combined with ``merge``.
+
+With the default ``k = 200`` the normalized rank error is about 1.3% for
+single quantiles and ranks and 1.7% for bin masses (``rank_error``), with
+99% confidence; exact minimum and maximum are kept alongside.
+"""
+from collections import OrderedDict
+
+import json
+import os
+
+import numpy as np
+
+import config
+from histograms import feature_matrix
+
+
+K = 200
+
+## Each level below the top holds 2/3 as many samples as the one above
+DECAY = 2.0 / 3.0
+MIN_CAPACITY = 2
+
+CHUNKSIZE = 100000
+
+
+class KLLSketch(object):
+    """Approximate quantiles of a stream of numbers in O(k) memory."""
+
+    def __init__(self, k = K, seed = None):
+        self.k = k
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.levels = [np.zeros(0)]
+        self._rng = np.random.RandomState(seed)
+
+    def capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(MIN_CAPACITY, int(np.ceil(self.k * DECAY ** depth)))
+
+    def update(self, values):
+        """Add the finite entries of ``values``."""
+        values = np.asarray(values, dtype = np.float64)
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        self.n += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        """Fold ``other`` (a sketch with the same ``k``) into this one."""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.zeros(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _compress(self):
+        ## While the sketch holds more than its total capacity, halve the
+        # lowest level that is over its own capacity into the next one:
+        # sort it, keep every other sample from a random offset, and so
+        # double the weight of the survivors
+        while (sum(len(items) for items in self.levels)
+               > sum(self.capacity(level) for level in range(len(self.levels)))):
+            level = next(level for level, items in enumerate(self.levels)
+                         if len(items) > self.capacity(level))
+
+            if level + 1 == len(self.levels):
+                self.levels.append(np.zeros(0))
+            items = np.sort(self.levels[level])
+            keep = len(items) % 2
+            promoted = items[keep + self._rng.randint(2)::2]
+            self.levels[level] = items[:keep]
+            self.levels[level + 1] = np.concatenate(
+                [self.levels[level + 1], promoted])
+
+    def _weighted(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level)
+                                  for level, items in enumerate(self.levels)])
+        order = np.argsort(items, kind = 'mergesort')
+        return items[order], np.cumsum(weights[order])
+
+    def quantiles(self, probabilities):
+        """Approximate values at the given probabilities in [0, 1]."""
+        probabilities = np.asarray(probabilities, dtype = np.float64)
+        if not self.n:
+            return np.full(probabilities.shape, np.nan)
+        items, cumulative = self._weighted()
+        index = np.searchsorted(cumulative, probabilities * cumulative[-1],
+                                side = 'left')
+        result = items[np.clip(index, 0, len(items) - 1)]
+
+        ## The extremes are known exactly
+        result[probabilities <= 0] = self.min
+        result[probabilities >= 1] = self.max
+        return result
+
+    def quantile(self, probability):
+        return float(self.quantiles([probability])[0])
+
+    def ranks(self, values, inclusive = False):
+        """Approximate fraction of values below (or at) each of ``values``."""
+        values = np.asarray(values, dtype = np.float64)
+        if not self.n:
+            return np.full(values.shape, np.nan)
+        items, cumulative = self._weighted()
+        index = np.searchsorted(items, values,
+                                side = 'right' if inclusive else 'left')
+        below = np.concatenate([[0.0], cumulative])[index]
+        return below / cumulative[-1]
+
+    def counts(self, edges):
+        """Approximate number of values in each ``[edges[i], edges[i + 1])``.
+
+        The last bin also includes the right edge, as ``np.histogram`` does.
+        """
+        ranks = self.ranks(edges)
+        ranks[-1] = self.ranks(edges[-1:], inclusive = True)[0]
+        return np.diff(ranks) * self.n
+
+    def rank_error(self, pmf = False):
+        """Normalized rank error bound (99% confidence) for this ``k``.
+
+        ``pmf`` gives the bound on the mass of a bin rather than a single
+        rank; the constants are the empirical fits used for KLL sketches in
+        Apache DataSketches.
+        """
+        if pmf:
+            return 2.446 / self.k ** 0.9433
+        return 2.296 / self.k ** 0.9723
+
+    def to_dict(self):
+        return {'k': self.k, 'n': self.n, 'min': self.min, 'max': self.max,
+                'levels': [items.tolist() for items in self.levels]}
+
+    @classmethod
+    def from_dict(cls, state):
+        sketch = cls(state['k'])
+        sketch.n = state['n']
+        sketch.min, sketch.max = state['min'], state['max']
+        sketch.levels = [np.asarray(items, dtype = np.float64)
+                         for items in state['levels']]
+        return sketch
+
+
+class SketchSet(object):
+    """One KLL sketch per feature, updated a chunk of rows at a time."""
+
+    def __init__(self, features, k = K):
+        self.sketches = OrderedDict(
+            (feature, KLLSketch(k)) for feature in features)
+
+    def __getitem__(self, feature):
+        return self.sketches[feature]
+
+    def __contains__(self, feature):
+        return feature in self.sketches
+
+    def update(self, data):
+        """Add the rows of ``data`` (a DataFrame, Dataset or dict of arrays)."""
+        matrix = feature_matrix(data, list(self.sketches))
+        for i, sketch in enumerate(self.sketches.values()):
+            sketch.update(matrix[:, i])
+
+    def merge(self, other):
+        for feature, sketch in other.sketches.items():
+            self.sketches[feature].merge(sketch)
+        return self
+
+    @classmethod
+    def from_data(cls, data, features, k = K, chunksize = CHUNKSIZE):
+        """Sketch ``data`` a chunk at a time, so memory stays bounded."""
+        sketches = cls(features, k)
+        for start in range(0, len(data), chunksize):
+            sketches.update(OrderedDict(
+                (feature, data[feature][start: start + chunksize])
+                for feature in features))
+        return sketches
+
+    def save(self, path):
+        state = OrderedDict((feature, sketch.to_dict())
+                            for feature, sketch in self.sketches.items())
+        tmp = '{}.{}.json'.format(os.path.splitext(path)[0], os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            state = json.load(f, object_pairs_hook = OrderedDict)
+        sketches = cls([])
+        for feature, sketch in state.items():
+            sketches.sketches[feature] = KLLSketch.from_dict(sketch)
+        return sketches
+
+
+def sketch_path(version, cache_dir = config.CACHE_DIR):
+    return os.path.join(cache_dir, 'sketches-{}.json'.format(version))
+
+
+def load_or_build(data, features, cache_dir = config.CACHE_DIR):
+    """The sketches of ``data``, read from the cache directory if present."""
+    path = sketch_path(data.version, cache_dir)
+    if os.path.exists(path):
+        return SketchSet.load(path)
+    sketches = SketchSet.from_data(data, features)
+    sketches.save(path)
+    return sketches
@@ -0,0 +1,153 @@
+"""Immutable snapshots of the dataset, swapped in when rows are appended.
+
+A ``Snapshot`` pairs one version of a dataset split with the aggregates
+(histograms, counts, sketches, figures, the layout) built from it, each
+built on first use. Nothing in a snapshot changes once built, so a request
+that took a snapshot reads one consistent version throughout.
+
+``Snapshots`` holds the current snapshot. With ``PUBG_RELOAD_INTERVAL``
+set, each worker polls the local source for appended rows, adds them to
+the cache (see ``ingest.append``) and swaps in a snapshot derived from the
+current one: aggregates that can take new rows are copied and updated
+with just the appended rows, the others are rebuilt when next used. What
+was saved to the cache for the replaced version (sorted columns and pairs,
+statistics, sketches) is then removed.
+"""
+import os
+import shutil
+import sys
+import threading
+import time
+
+import config
+import dataset
+import ingest
+
+
+class Snapshot(object):
+    """One version of a dataset and the aggregates built from it.
+
+    ``engines`` maps an aggregate's name to a ``(build, update)`` pair:
+    ``build(snapshot)`` computes it from scratch and ``update(old,
+    snapshot, rows)``, if not None, derives it from the previous snapshot's
+    aggregate and the appended ``rows`` without changing ``old``.
+    """
+
+    def __init__(self, data, engines):
+        self.data = data
+        self.engines = engines
+        self._built = {}
+        self._lock = threading.RLock()
+
+    @property
+    def version(self):
+        return self.data.version
+
+    def get(self, name):
+        """The aggregate ``name``, built on first use."""
+        if name not in self._built:
+            with self._lock:
+                if name not in self._built:
+                    self._built[name] = self.engines[name][0](self)
+        return self._built[name]
+
+    def extend(self, data, rows):
+        """The snapshot of ``data``, the rows of this one plus ``rows``."""
+        extended = Snapshot(data, self.engines)
+        for name, (build, update) in self.engines.items():
+            if update is not None and name in self._built:
+                extended._built[name] = update(self._built[name], extended,
+                                               rows)
+        return extended
+
+
+class Snapshots(object):
+    """The current snapshot of split ``split`` of the cache in ``cache_dir``."""
+
+    def __init__(self, data, engines, split = 'train',
+                 cache_dir = config.CACHE_DIR,
+                 interval = config.RELOAD_INTERVAL):
+        self.current = Snapshot(data, engines)
+        self.split = split
+        self.cache_dir = cache_dir
+        self.interval = interval
+        self._thread = None
+
+    def reload(self):
+        """Add appended rows and swap in the new snapshot, if any.
+
+        Returns the number of rows the current snapshot grew by, or None
+        when the cache was rebuilt and the snapshot replaced outright.
+        """
+        ingest.append(self.cache_dir)
+        manifest = ingest.read_manifest(self.cache_dir)
+        old = self.current
+        if manifest['version'] == old.data.manifest['version']:
+            return 0
+
+        data = dataset.load(self.cache_dir).split(self.split)
+        if manifest.get('base') == old.data.manifest.get('base') \
+                and len(data) >= len(old.data):
+            added = len(data) - len(old.data)
+            self.current = old.extend(data, data.rows(len(old.data)))
+        else:
+            added = None
+            self.current = Snapshot(data, old.engines)
+        remove_version(self.cache_dir, old.version)
+        return added
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                added = self.reload()
+            except Exception as error:
+                _log('reload failed: {!r}'.format(error))
+                continue
+            if added != 0:
+                _log('now serving {} rows ({})'.format(
+                    len(self.current.data),
+                    'dataset rebuilt' if added is None
+                    else '{} appended'.format(added)))
+
+    def watch(self):
+        """Poll for appended rows in a background thread of this process.
+
+        Call it in every worker after the fork; threads do not survive one.
+        """
+        if not self.interval or (self._thread is not None
+                                 and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target = self._run,
+                                        name = 'dataset-reload')
+        self._thread.daemon = True
+        self._thread.start()
+
+
+def remove_version(cache_dir, version):
+    """Remove what was saved for dataset version ``version`` in the cache.
+
+    These are the files and directories named ``<kind>-<version>`` with any
+    extension: sorted columns and pairs, statistics and sketches. Requests still
+    reading the old snapshot keep the arrays they memory-mapped; anything it
+    saves afterwards is removed when that worker reloads in turn.
+    """
+    suffix = '-' + version
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        stem = name if os.path.isdir(path) else os.path.splitext(name)[0]
+        kind = stem[:-len(suffix)]
+        if not stem.endswith(suffix) or not kind or '-' in kind:
+            continue
+        ## Another worker may be removing it too
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors = True)
+        elif os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _log(message):
+    sys.stderr.write('[reload {}] {}\n'.format(os.getpid(), message))
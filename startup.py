@@ -0,0 +1,79 @@
+"""Startup instrumentation: where the time goes when a worker boots.
+
+Set ``PUBG_PROFILE_STARTUP=1`` to log how long each boot phase (imports,
+data load, image hashing, layout build, aggregates) takes, with the slowest
+top-level imports broken out. Imports are timed until ``app.warm()`` ends
+the boot and logs the total::
+
+    PUBG_PROFILE_STARTUP=1 python app.py
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import os
+import sys
+import time
+
+try:
+    import builtins
+except ImportError:
+    import __builtin__ as builtins
+
+import config
+
+
+ENABLED = config.PROFILE_STARTUP
+
+## Phase name -> seconds, and top-level module -> seconds spent importing it
+PHASES = OrderedDict()
+IMPORTS = {}
+
+_original_import = builtins.__import__
+_depth = [0]
+
+
+def _timed_import(name, *args, **kwargs):
+    ## Only time the outermost import of a module not loaded yet; nested
+    ## imports are part of their importer's time
+    if _depth[0] or name in sys.modules:
+        return _original_import(name, *args, **kwargs)
+
+    _depth[0] += 1
+    start = time.time()
+    try:
+        return _original_import(name, *args, **kwargs)
+    finally:
+        _depth[0] -= 1
+        top = name.split('.')[0]
+        IMPORTS[top] = IMPORTS.get(top, 0) + time.time() - start
+
+
+def _log(message):
+    sys.stderr.write('[startup {}] {}\n'.format(os.getpid(), message))
+
+
+@contextmanager
+def phase(name):
+    """Time the enclosed block as one boot phase."""
+    start = time.time()
+    try:
+        yield
+    finally:
+        PHASES[name] = PHASES.get(name, 0) + time.time() - start
+        if ENABLED:
+            _log('{:<16} {:8.3f}s'.format(name, time.time() - start))
+
+
+def report(top = 10):
+    """Log the total boot time so far and the slowest imports."""
+    if not ENABLED:
+        return
+    builtins.__import__ = _original_import
+    _log('{:<16} {:8.3f}s'.format('total', sum(PHASES.values())))
+    for name, seconds in sorted(IMPORTS.items(),
+                                key = lambda item: -item[1])[:top]:
+        _log('  import {:<20} {:8.3f}s'.format(name, seconds))
+
+
+if ENABLED:
+    builtins.__import__ = _timed_import
@@ -0,0 +1,191 @@
+"""Summary statistics of every column, persisted per dataset version.
+
+All columns are summarized in one vectorized pass over an (N, C) matrix
+and written to ``stats-<version>.json`` in the cache directory, so a
+restart (or another worker) only reads the file. The numbers are served
+as JSON from ``/api/stats`` and ``/api/stats/<feature>``.
+"""
+from collections import OrderedDict
+
+import json
+import os
+
+import flask
+import numpy as np
+
+import config
+from features import FEATURES, join_names
+from histograms import feature_matrix
+
+
+QUANTILES = [0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99]
+
+## |skewness| and |excess kurtosis| below which a feature reads as normal
+SKEW_LIMIT = 0.5
+KURTOSIS_LIMIT = 1.0
+
+
+def _normaltest(matrix):
+    """D'Agostino-Pearson K² p-values per column (NaN if too few values)."""
+    from scipy import stats
+
+    pvalues = np.full(matrix.shape[1], np.nan)
+    if len(matrix) < 20:
+        return pvalues
+    if np.isfinite(matrix).all():
+        return stats.normaltest(matrix, axis = 0)[1]
+    for i in range(matrix.shape[1]):
+        values = matrix[:, i][np.isfinite(matrix[:, i])]
+        if len(values) >= 20:
+            pvalues[i] = stats.normaltest(values)[1]
+    return pvalues
+
+
+def shape(skewness, kurtosis):
+    """"normal", "left-skewed", "right-skewed" or "constant" from the moments.
+
+    The moments are NaN for a column without variance (or values).
+    """
+    if not (np.isfinite(skewness) and np.isfinite(kurtosis)):
+        return 'constant'
+    if abs(skewness) < SKEW_LIMIT and abs(kurtosis) < KURTOSIS_LIMIT:
+        return 'normal'
+    return 'right-skewed' if skewness > 0 else 'left-skewed'
+
+
+def compute(data, columns = None):
+    """Summary statistics of ``columns`` (default: all) of ``data``."""
+    columns = list(columns or data.names)
+    matrix = feature_matrix(data, columns)
+
+    count = np.isfinite(matrix).sum(axis = 0)
+    mean = np.nanmean(matrix, axis = 0)
+    centered = matrix - mean
+    m2 = np.nanmean(centered ** 2, axis = 0)
+    m3 = np.nanmean(centered ** 3, axis = 0)
+    m4 = np.nanmean(centered ** 4, axis = 0)
+    del centered
+
+    ## Biased sample skewness and Fisher kurtosis, as scipy.stats reports
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        skewness = m3 / m2 ** 1.5
+        kurtosis = m4 / m2 ** 2 - 3
+    quantiles = np.nanpercentile(matrix, [q * 100 for q in QUANTILES],
+                                 axis = 0)
+    pvalues = _normaltest(matrix)
+
+    summary = OrderedDict()
+    for i, name in enumerate(columns):
+        summary[name] = OrderedDict([
+            ('count', int(count[i])),
+            ('mean', mean[i]),
+            ('std', np.sqrt(m2[i] * count[i] / max(count[i] - 1, 1))),
+            ('min', np.nanmin(matrix[:, i])),
+            ('max', np.nanmax(matrix[:, i])),
+            ('skewness', skewness[i]),
+            ('kurtosis', kurtosis[i]),
+            ('quantiles', OrderedDict(
+                ('{:g}'.format(q), quantiles[j, i])
+                for j, q in enumerate(QUANTILES))),
+            ('normaltest_pvalue', pvalues[i]),
+            ('shape', shape(skewness[i], kurtosis[i])),
+        ])
+    return _to_json_types(summary)
+
+
+def _to_json_types(value):
+    """Plain floats, with NaN/inf as None, so the JSON stays standard."""
+    if isinstance(value, dict):
+        return OrderedDict((k, _to_json_types(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_to_json_types(v) for v in value]
+    if isinstance(value, (float, np.floating)):
+        return float(value) if np.isfinite(value) else None
+    return value
+
+
+class StatsStore(object):
+    """Statistics of a dataset, loaded from or saved to the cache directory."""
+
+    def __init__(self, data, cache_dir = config.CACHE_DIR):
+        self.data = data
+        self.path = os.path.join(cache_dir,
+                                 'stats-{}.json'.format(data.version))
+        self._stats = None
+        self._json = {}
+
+    @property
+    def stats(self):
+        if self._stats is None:
+            if os.path.exists(self.path):
+                with open(self.path) as f:
+                    self._stats = json.load(f, object_pairs_hook = OrderedDict)
+            else:
+                self._stats = compute(self.data)
+                self.save()
+        return self._stats
+
+    def save(self):
+        ## Every worker may save the same version at once; each writes its own
+        ## temporary file
+        tmp = '{}.{}.json'.format(self.path[:-5], os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(self._stats, f, indent = 2)
+        os.replace(tmp, self.path)
+
+    def update(self, feature, key, value):
+        """Store extra results (e.g. a profile) under ``key`` of a feature."""
+        self.stats[feature][key] = _to_json_types(value)
+        self._json = {}
+
+    def __getitem__(self, feature):
+        return self.stats[feature]
+
+    def __contains__(self, feature):
+        return feature in self.stats
+
+    def json(self, feature = None):
+        """Serialized statistics of one feature (or all), built once."""
+        if feature not in self._json:
+            stats = self.stats if feature is None else self.stats[feature]
+            self._json[feature] = json.dumps(
+                OrderedDict([('version', self.data.version),
+                             ('feature', feature), ('stats', stats)]))
+        return self._json[feature]
+
+    def shape_summary(self, features = None):
+        """A sentence such as "Most features are right-skewed; only ... \""""
+        groups = OrderedDict()
+        for feature in features or FEATURES:
+            groups.setdefault(self[feature]['shape'], []).append(
+                FEATURES.get(feature, feature))
+        groups = sorted(groups.items(), key = lambda group: -len(group[1]))
+
+        sentence = '{} features are {}'.format(
+            'Most' if len(groups) > 1 else 'All', groups[0][0])
+        for name, members in groups[1:]:
+            sentence += '; only {} {} to be {}'.format(
+                join_names(members), 'appears' if len(members) == 1
+                else 'appear', name)
+        return sentence + '.'
+
+
+def init_app(server, get_store):
+    """Register the statistics API; ``get_store`` returns the StatsStore."""
+
+    def all_stats():
+        return flask.Response(get_store().json(),
+                              mimetype = 'application/json')
+
+    def feature_stats(feature):
+        store = get_store()
+        if feature not in store:
+            return flask.Response(
+                json.dumps({'error': 'Unknown feature: {}'.format(feature)}),
+                status = 404, mimetype = 'application/json')
+        return flask.Response(store.json(feature),
+                              mimetype = 'application/json')
+
+    server.add_url_rule('/api/stats', 'stats', all_stats)
+    server.add_url_rule('/api/stats/<feature>', 'feature_stats',
+                        feature_stats)
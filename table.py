@@ -0,0 +1,132 @@
+"""Server-side filtering, sorting and paging for the player DataTable.
+
+The table runs with ``filter_action``, ``sort_action`` and ``page_action``
+set to "custom", so every query is answered here against the column arrays
+and only the requested page is sent to the browser. ``data`` may be a
+DataFrame or a ``dataset.Dataset``; both are indexed by column name.
+
+A page is sent column by column (see ``columnar``) with only the displayed
+columns, rounded to ``DECIMALS``; ``assets/table_data.js`` expands it into
+the DataTable's rows in the browser.
+"""
+import operator
+
+import numpy as np
+
+
+## Decimal places floats are shown with
+DECIMALS = 2
+
+OPERATORS = [['ge ', '>='],
+             ['le ', '<='],
+             ['lt ', '<'],
+             ['gt ', '>'],
+             ['ne ', '!='],
+             ['eq ', '='],
+             ['contains '],
+             ['datestartswith ']]
+
+## Operators matching the text of a cell rather than comparing numbers
+TEXT_OPERATORS = ('contains', 'datestartswith')
+
+
+def split_filter_part(filter_part):
+    """Split ``{column} op value`` into its column, operator and value."""
+    for operator_type in OPERATORS:
+        for op in operator_type:
+            if op in filter_part:
+                name_part, value_part = filter_part.split(op, 1)
+                name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+
+                ## The word operators are the canonical names, e.g. "ge"
+                op_name = operator_type[0].strip()
+
+                value_part = value_part.strip()
+                v0 = value_part[0] if value_part else ''
+                if v0 and v0 == value_part[-1] and v0 in ("'", '"', '`'):
+                    value = value_part[1: -1].replace('\\' + v0, v0)
+                elif op_name in TEXT_OPERATORS:
+                    ## Matched against the text of the cells: "2", not "2.0"
+                    value = value_part
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+
+                return name, op_name, value
+
+    return None, None, None
+
+
+def _compare(values, op, value):
+    if op in TEXT_OPERATORS:
+        strings = values.astype(str)
+        if op == 'contains':
+            return np.char.find(strings, str(value)) >= 0
+        return np.char.startswith(strings, str(value))
+
+    if isinstance(value, str):
+        ## A number column can only match a non-numeric value by its text
+        values = values.astype(str)
+
+    return getattr(operator, op)(values, value)
+
+
+def filter_index(data, filter_query):
+    """Return the positions of the rows matching a DataTable filter_query."""
+    mask = np.ones(len(data), dtype = bool)
+    for filter_part in (filter_query or '').split(' && '):
+        name, op, value = split_filter_part(filter_part)
+        if name is None or name not in data:
+            continue
+        mask &= _compare(np.asarray(data[name]), op, value)
+    return np.flatnonzero(mask)
+
+
+def sort_index(data, index, sort_by):
+    """Order ``index`` by a DataTable multi-column ``sort_by`` list."""
+    if not sort_by:
+        return index
+
+    ## np.lexsort treats the last key as the primary one
+    keys = []
+    for col in reversed(sort_by):
+        values = np.asarray(data[col['column_id']])[index]
+        keys.append(-values if col['direction'] == 'desc' else values)
+    return index[np.lexsort(keys)]
+
+
+def page_index(index, page_current, page_size):
+    """Slice one page out of ``index``; also return the page count."""
+    page_count = max(1, -(-len(index) // page_size))
+    start = page_current * page_size
+    return index[start: start + page_size], page_count
+
+
+def query(data, page_current, page_size, sort_by, filter_query):
+    """Filter, sort and page ``data``; return row positions and page count."""
+    index = filter_index(data, filter_query)
+    index = sort_index(data, index, sort_by)
+    return page_index(index, page_current or 0, page_size)
+
+
+def columnar(data, index, columns, decimals = DECIMALS):
+    """The rows at positions ``index`` as ``{'ids', 'columns', 'values'}``.
+
+    ``values`` holds one list per column of ``columns``, with floats rounded
+    to ``decimals`` places and NaN as None; ``ids`` are the row positions,
+    used as the DataTable row ids.
+    """
+    values = []
+    for name in columns:
+        column = np.asarray(data[name])[index]
+        if column.dtype.kind == 'f':
+            ## Round in float64: float32 values would widen with noise digits
+            column = np.round(column.astype(np.float64), decimals)
+            values.append([None if np.isnan(v) else v
+                           for v in column.tolist()])
+        else:
+            values.append(column.tolist())
+    return {'ids': np.asarray(index).tolist(), 'columns': list(columns),
+            'values': values}
@@ -0,0 +1,28 @@
+"""CallbackCache: results are keyed by the snapshot they were computed on."""
+import cache
+
+
+class Snap(object):
+    def __init__(self, version):
+        self.version = version
+
+
+def test_result_is_stored_under_the_snapshot_it_read():
+    snaps = [Snap('a')]
+    callback_cache = cache.CallbackCache(lambda: snaps[0], path = '')
+
+    @callback_cache.memoize
+    def version_of(snap, value):
+        ## A reload swapping the snapshot mid-call
+        snaps[0] = Snap('b')
+        return snap.version, value
+
+    assert version_of(1) == ('a', 1)
+    assert callback_cache.local.get(
+        callback_cache.key('test_cache.version_of', 'a', (1,))) \
+        == (('a', 1), True)
+
+    ## The new snapshot gets its own result
+    snaps[0] = Snap('b')
+    assert version_of(1) == ('b', 1)
+    assert callback_cache.stats()['misses'] == 2
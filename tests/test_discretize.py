@@ -0,0 +1,49 @@
+"""Interval binning of float32 columns whose values sit on bin edges."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from discretize import BIN_SPECS, Discretizer
+from rebin import Rebinner
+
+
+FEATURES = ['KillDeathRatio', 'HeadshotKillRatio']
+
+## Every two-decimal value from 0.00 to 20.00, many of them bin edges
+VALUES = np.round(np.arange(2001) * 0.01, 2)
+
+
+def frame(values, dtype):
+    return pd.DataFrame({feature: values.astype(dtype)
+                         for feature in FEATURES})
+
+
+def specs():
+    return {feature: BIN_SPECS[feature] for feature in FEATURES}
+
+
+def test_float32_bins_like_float64():
+    wide = Discretizer(frame(VALUES, np.float64), specs())
+    narrow = Discretizer(frame(VALUES, np.float32), specs())
+    assert narrow.first.tolist() == wide.first.tolist()
+    for counts, expected in zip(narrow.counts, wide.counts):
+        assert counts.tolist() == expected.tolist()
+
+
+def test_value_on_an_edge_is_in_the_interval_it_starts():
+    discretizer = Discretizer(frame(np.full(10, 0.45), np.float32), specs())
+    assert discretizer.modes('HeadshotKillRatio')[0] == ('0.450 - 0.499', 1.0)
+    ## Each interval holds its five values: 0.45 - 0.49
+    counts = Discretizer(frame(VALUES, np.float32), specs()).counts[1]
+    assert set(counts[:-1].tolist()) == {5}
+
+
+@pytest.mark.parametrize('feature', FEATURES)
+def test_rebinned_counts_match_for_float32(feature):
+    for width in [0.01, 0.05, 0.1, 0.2, 1]:
+        wide, wide_edges = Rebinner(frame(VALUES, np.float64)).counts(
+            feature, width)
+        narrow, narrow_edges = Rebinner(frame(VALUES, np.float32)).counts(
+            feature, width)
+        assert narrow.tolist() == wide.tolist()
+        assert np.allclose(narrow_edges, wide_edges)
@@ -0,0 +1,47 @@
+"""Histograms: appended rows on and beyond the top bin edge."""
+import numpy as np
+import pandas as pd
+
+from histograms import Histograms
+
+
+FEATURES = ['KillDeathRatio']
+
+
+def frame(values):
+    return pd.DataFrame({'KillDeathRatio': np.asarray(values, np.float64)})
+
+
+def test_counts_match_numpy_with_the_top_edge_in_the_last_bin():
+    values = np.linspace(0, 10, 101)
+    counts, edges = Histograms(frame(values), FEATURES, bins = 10)[
+        'KillDeathRatio']
+    expected, expected_edges = np.histogram(values, bins = 10)
+    assert counts.tolist() == expected.tolist()
+    assert np.allclose(edges, expected_edges)
+
+
+def test_update_with_a_value_on_the_top_edge_keeps_the_bins():
+    old = frame(np.linspace(0, 10, 101))
+    histograms = Histograms(old, FEATURES, bins = 10)
+    edges = histograms.edges.copy()
+    rows = frame([10.0, 10.0, 0.0])
+    histograms.update(pd.concat([old, rows]), rows)
+
+    counts, new_edges = histograms['KillDeathRatio']
+    assert np.array_equal(new_edges, edges[0])
+    assert counts[-1] == 11 + 2 and counts[0] == 10 + 1
+    assert counts.sum() == 104
+
+
+def test_update_past_the_top_edge_widens_the_range():
+    old = frame(np.linspace(0, 10, 101))
+    histograms = Histograms(old, FEATURES, bins = 10)
+    rows = frame([10.5])
+    data = pd.concat([old, rows])
+    histograms.update(data, rows)
+
+    fresh = Histograms(data, FEATURES, bins = 10)
+    assert histograms.edges.tolist() == fresh.edges.tolist()
+    assert histograms.counts.tolist() == fresh.counts.tolist()
+    assert histograms.edges[0, -1] == 10.5
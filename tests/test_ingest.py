@@ -0,0 +1,138 @@
+"""Appending rows to the cache: append_npy and its fallbacks in append()."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dataset
+import ingest
+from features import FEATURES
+
+
+def save_tight(path, values):
+    """Save a 1-d ``.npy`` whose header has no room to spare."""
+    header = "{{'descr': {!r}, 'fortran_order': False, 'shape': ({},), }}" \
+        .format(np.lib.format.dtype_to_descr(values.dtype), len(values))
+    with open(path, 'wb') as f:
+        f.write(np.lib.format.magic(1, 0))
+        f.write(np.uint16(len(header) + 1).tobytes())
+        f.write((header + '\n').encode('latin1'))
+        f.write(np.ascontiguousarray(values).tobytes())
+
+
+def test_append_npy_in_place(tmp_path):
+    path = str(tmp_path / 'column.npy')
+    np.save(path, np.arange(10, dtype = np.int32))
+    mapped = np.load(path, mmap_mode = 'r')
+
+    assert ingest.append_npy(path, 10, np.arange(10, 15, dtype = np.int32))
+    assert np.load(path).tolist() == list(range(15))
+    ## Arrays mapped before the append still read the old rows
+    assert mapped.tolist() == list(range(10))
+
+    ## Rows past ``rows`` (written by an interrupted append) are overwritten
+    assert ingest.append_npy(path, 12, np.array([-1, -2], dtype = np.int32))
+    assert np.load(path).tolist() == list(range(12)) + [-1, -2]
+
+
+def test_append_npy_header_too_small(tmp_path):
+    path = str(tmp_path / 'column.npy')
+    save_tight(path, np.arange(10, dtype = np.int32))
+    before = open(path, 'rb').read()
+
+    assert not ingest.append_npy(path, 10, np.arange(10, 100, dtype = np.int32))
+    assert open(path, 'rb').read() == before
+
+
+def test_append_npy_dtype_change(tmp_path):
+    path = str(tmp_path / 'column.npy')
+    np.save(path, np.arange(10, dtype = np.int32))
+    before = open(path, 'rb').read()
+
+    assert not ingest.append_npy(path, 10, np.array([0.5], dtype = np.float32))
+    assert open(path, 'rb').read() == before
+
+
+#--------- append()
+COLUMNS = 52
+
+
+def source_frame(rows, seed):
+    """Raw statistics in the layout select_columns() expects."""
+    rng = np.random.RandomState(seed)
+    header = ['player_name', 'tracker_id'] + [
+        'solo_Column{}'.format(i) for i in range(COLUMNS - 2)]
+    ## Every feature clean() does not derive, and what it derives them from
+    names = [feature for feature in FEATURES
+             if feature not in ('TotalDistance', 'AvgTotalDistance')]
+    names += ['WalkDistance', 'RideDistance', 'AvgWalkDistance',
+              'AvgRideDistance', 'Revives']
+    for i, name in enumerate(names):
+        header[2 + i] = 'solo_' + name
+    frame = pd.DataFrame(np.round(rng.gamma(2.0, 50.0, (rows, COLUMNS)), 2),
+                         columns = header)
+    frame['solo_Kills'] = rng.poisson(20, rows)
+    frame['player_name'] = ['p{}'.format(i) for i in range(rows)]
+    return frame
+
+
+@pytest.fixture
+def cache(tmp_path):
+    source = str(tmp_path / 'source.csv')
+    cache_dir = str(tmp_path / 'cache')
+    source_frame(100, 0).to_csv(source, index = False)
+    ingest.build(source, 0, cache_dir)
+    return source, cache_dir
+
+
+def append_rows(source, frame):
+    frame.to_csv(source, mode = 'a', header = False, index = False)
+
+
+def test_append_in_place(cache):
+    source, cache_dir = cache
+    path = os.path.join(cache_dir, 'Kills.npy')
+    size = os.path.getsize(path)
+    append_rows(source, source_frame(20, 1))
+
+    assert ingest.append(cache_dir) == 20
+    data = dataset.load(cache_dir)
+    assert len(data) == 120 and len(data.split('train')) == 110
+    assert data['Kills'][100:].tolist() \
+        == source_frame(20, 1)['solo_Kills'].tolist()
+    assert os.path.getsize(path) == size + 20 * 4
+
+
+def test_append_rewrites_when_header_too_small(cache):
+    source, cache_dir = cache
+    path = os.path.join(cache_dir, 'Kills.npy')
+    old = np.load(path)
+    save_tight(path, old)
+    append_rows(source, source_frame(1000, 1))
+
+    assert ingest.append(cache_dir) == 1000
+    kills = dataset.load(cache_dir)['Kills']
+    assert kills[:100].tolist() == old.tolist()
+    assert kills[100:].tolist() \
+        == source_frame(1000, 1)['solo_Kills'].tolist()
+
+
+def test_append_widens_float32_exactly(cache):
+    source, cache_dir = cache
+    assert dataset.load(cache_dir)['KillDeathRatio'].dtype == np.float32
+    expected = pd.read_csv(source)['solo_KillDeathRatio'].tolist()
+    frame = source_frame(5, 1)
+    frame['solo_KillDeathRatio'] = 1.23456789
+    append_rows(source, frame)
+
+    assert ingest.append(cache_dir) == 5
+    data = dataset.load(cache_dir)
+    values = data['KillDeathRatio']
+    assert values.dtype == np.float64
+    ## Stored grouped by split; the original rows are the first 100
+    order = np.argsort(np.concatenate([
+        np.load(os.path.join(cache_dir, 'split_{}.npy'.format(name)))
+        for name in data.manifest['splits']]))
+    assert values[order][:100].tolist() == expected
+    assert values[100:].tolist() == [1.23456789] * 5
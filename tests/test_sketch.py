@@ -0,0 +1,84 @@
+"""KLLSketch: compaction, merging and the documented rank error bound."""
+import numpy as np
+import pytest
+
+from sketch import KLLSketch
+
+
+N = 200000
+
+
+@pytest.fixture(scope = 'module')
+def values():
+    return np.random.RandomState(0).gamma(2.0, 50.0, N)
+
+
+def sketch_of(values, seed = 0, chunksize = 10000):
+    sketch = KLLSketch(seed = seed)
+    for start in range(0, len(values), chunksize):
+        sketch.update(values[start: start + chunksize])
+    return sketch
+
+
+def exact_ranks(values, points):
+    return np.searchsorted(np.sort(values), points, side = 'left') / len(values)
+
+
+def test_compaction_bounds_memory_and_keeps_weight(values):
+    sketch = sketch_of(values)
+    items = sum(len(level) for level in sketch.levels)
+    assert items <= sum(sketch.capacity(level)
+                        for level in range(len(sketch.levels)))
+    assert items < 2000
+    assert sketch.n == N
+    ## Compaction doubles the weight of the half it keeps
+    assert sum(len(level) * 2 ** i
+               for i, level in enumerate(sketch.levels)) == N
+    assert (sketch.min, sketch.max) == (values.min(), values.max())
+
+
+def test_quantiles_within_rank_error(values):
+    sketch = sketch_of(values)
+    probabilities = np.linspace(0.01, 0.99, 99)
+    ranks = exact_ranks(values, sketch.quantiles(probabilities))
+    assert np.abs(ranks - probabilities).max() <= sketch.rank_error()
+    assert sketch.quantiles([0, 1]).tolist() == [values.min(), values.max()]
+
+
+def test_ranks_within_rank_error(values):
+    sketch = sketch_of(values)
+    points = np.percentile(values, np.linspace(1, 99, 50))
+    error = np.abs(sketch.ranks(points) - exact_ranks(values, points))
+    assert error.max() <= sketch.rank_error()
+
+
+def test_counts_within_bin_mass_error(values):
+    sketch = sketch_of(values)
+    counts, edges = np.histogram(values, bins = 30)
+    error = np.abs(sketch.counts(edges) - counts) / N
+    assert error.max() <= sketch.rank_error(pmf = True)
+    assert sketch.counts(edges).sum() == pytest.approx(N)
+
+
+def test_merge_of_chunk_sketches_matches_one_sketch(values):
+    chunks = np.array_split(values, 8)
+    merged = KLLSketch(seed = 1)
+    for i, chunk in enumerate(chunks):
+        merged.merge(sketch_of(chunk, seed = i + 2))
+    whole = sketch_of(values)
+
+    assert (merged.n, merged.min, merged.max) == (whole.n, whole.min,
+                                                  whole.max)
+    probabilities = np.linspace(0.01, 0.99, 99)
+    merged_ranks = exact_ranks(values, merged.quantiles(probabilities))
+    whole_ranks = exact_ranks(values, whole.quantiles(probabilities))
+    assert np.abs(merged_ranks - probabilities).max() <= merged.rank_error()
+    assert np.abs(merged_ranks - whole_ranks).max() <= 2 * whole.rank_error()
+
+
+def test_round_trips_through_dict(values):
+    sketch = sketch_of(values)
+    loaded = KLLSketch.from_dict(sketch.to_dict())
+    probabilities = np.linspace(0, 1, 11)
+    assert loaded.quantiles(probabilities).tolist() \
+        == sketch.quantiles(probabilities).tolist()
@@ -0,0 +1,21 @@
+"""Distribution shape labels of the summary statistics."""
+import numpy as np
+import pandas as pd
+
+import stats
+
+
+def test_shape_labels():
+    assert stats.shape(0.1, 0.2) == 'normal'
+    assert stats.shape(2.0, 5.0) == 'right-skewed'
+    assert stats.shape(-2.0, 5.0) == 'left-skewed'
+    assert stats.shape(np.nan, np.nan) == 'constant'
+
+
+def test_zero_variance_column_is_constant():
+    rng = np.random.RandomState(0)
+    data = pd.DataFrame({'Kills': np.full(100, 3.0),
+                         'WinRatio': rng.gamma(1.0, 10.0, 100)})
+    summary = stats.compute(data, ['Kills', 'WinRatio'])
+    assert summary['Kills']['shape'] == 'constant'
+    assert summary['WinRatio']['shape'] == 'right-skewed'
@@ -0,0 +1,34 @@
+"""Filter queries of the player DataTable."""
+import numpy as np
+import pandas as pd
+
+import table
+
+
+DATA = pd.DataFrame({
+    'Kills': np.array([2, 12, 20, 3], dtype = np.int32),
+    'WinRatio': np.array([0.25, 2.5, 1.0, 12.0], dtype = np.float32),
+})
+
+
+def test_text_operators_keep_the_value_as_written():
+    assert table.split_filter_part('{Kills} contains 2') \
+        == ('Kills', 'contains', '2')
+    assert table.split_filter_part('{Kills} datestartswith 2') \
+        == ('Kills', 'datestartswith', '2')
+    assert table.split_filter_part('{Kills} ge 2') == ('Kills', 'ge', 2.0)
+
+
+def test_contains_matches_the_text_of_numbers():
+    assert table.filter_index(DATA, '{Kills} contains 2').tolist() == [0, 1, 2]
+    assert table.filter_index(DATA, '{WinRatio} contains 2').tolist() \
+        == [0, 1, 3]
+    assert table.filter_index(DATA, '{Kills} datestartswith 2').tolist() \
+        == [0, 2]
+
+
+def test_comparisons_are_numeric():
+    assert table.filter_index(DATA, '{Kills} > 3').tolist() == [1, 2]
+    assert table.filter_index(DATA, '{WinRatio} = 2.5').tolist() == [1]
+    assert table.filter_index(DATA, '{Kills} >= 3 && {WinRatio} < 5') \
+        .tolist() == [1, 2]